@@ -0,0 +1,31 @@
+import argparse
+import os
+
+from main import ESI_PAGE_WORKERS, UNIVERSE_GRAPH_PATH, client, crawl_universe_graph, load_sde_universe_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline universe graph used for nearby-system lookups.")
+    parser.add_argument("--output", default=UNIVERSE_GRAPH_PATH, help="Graph file to write.")
+    parser.add_argument(
+        "--sde-dir",
+        default=os.getenv("UNIVERSE_SDE_DIR"),
+        help="Directory with mapSolarSystems.csv and mapSolarSystemJumps.csv (static data dump). "
+        "When omitted the graph is crawled from ESI.",
+    )
+    parser.add_argument("--workers", type=int, default=max(ESI_PAGE_WORKERS, 8), help="Concurrent ESI crawl workers.")
+    args = parser.parse_args()
+
+    if args.sde_dir:
+        graph = load_sde_universe_graph(args.sde_dir)
+    else:
+        graph = crawl_universe_graph(client, workers=args.workers)
+    graph.save(args.output)
+    print(
+        f"Wrote {len(graph.system_ids)} systems and {len(graph.neighbors)} gate links to {args.output}",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
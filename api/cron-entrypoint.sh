@@ -4,7 +4,7 @@ set -eu
 schedule="${PREWARM_CRON:-*/30 * * * *}"
 cron_file="/tmp/prewarm.cron"
 
-env_vars="CACHE_DIR SCAN_CACHE_TTL ESI_SLEEP ESI_RETRIES ESI_TIMEOUT PREWARM_OUTPUT_DIR PREWARM_STATUS_FILE PREWARM_HISTORY_FILE PREWARM_LOCK_FILE PREWARM_START_SYSTEMS PREWARM_MAX_JUMPS PREWARM_SAMPLE_SIZE PREWARM_TYPES_PAGES PREWARM_ORDER_PAGES PREWARM_HOME_ORDER_PAGES PREWARM_LIMIT PREWARM_MIN_SECURITY PREWARM_MIN_MARGIN PREWARM_MAX_RUNTIME PREWARM_BUDGET PREWARM_MODE PREWARM_SAMPLE_SEED PREWARM_FORCE PREWARM_RETRY_EMPTY PREWARM_TUNE PREWARM_CARGO_M3 PREWARM_MIN_PROFIT_PER_JUMP PREWARM_MIN_RESULTS PREWARM_FALLBACK_MAX_JUMPS PREWARM_FALLBACK_MIN_SECURITY"
+env_vars="CACHE_DIR SCAN_CACHE_TTL ESI_RATE ESI_BURST ESI_MIN_RATE ESI_ERROR_LIMIT_SAFE ESI_ERROR_LIMIT_FLOOR ESI_BACKOFF_BASE ESI_BACKOFF_MAX ESI_RETRIES ESI_TIMEOUT ESI_CACHE_DB UNIVERSE_GRAPH_PATH NEARBY_CACHE_MAX_ENTRIES TYPES_CACHE_TTL ESI_TRANSPORT ESI_POOL_SIZE ESI_PAGE_WORKERS ESI_HTTP_CACHE ESI_HTTP_CACHE_PREFIXES ESI_HTTP_CACHE_MAX_AGE SCAN_WORKERS SCAN_SNAPSHOT SCAN_VECTORIZED SCAN_PRUNE SCAN_PRUNE_TTL SCAN_PRUNE_SLACK TYPE_BOUNDS_PATH MARKET_SNAPSHOT_FILES MARKET_SNAPSHOT_DIR MARKET_SNAPSHOT_TTL PREWARM_OUTPUT_DIR PREWARM_STATUS_FILE PREWARM_HISTORY_FILE PREWARM_LOCK_FILE PREWARM_AGGREGATE_FILE OPPORTUNITY_DB PREWARM_AGGREGATE_LABEL PREWARM_WORKERS PREWARM_START_SYSTEMS PREWARM_MAX_JUMPS PREWARM_SAMPLE_SIZE PREWARM_TYPES_PAGES PREWARM_ORDER_PAGES PREWARM_HOME_ORDER_PAGES PREWARM_LIMIT PREWARM_MIN_SECURITY PREWARM_MIN_MARGIN PREWARM_MAX_RUNTIME PREWARM_BUDGET PREWARM_MODE PREWARM_SAMPLE_SEED PREWARM_FORCE PREWARM_RETRY_EMPTY PREWARM_TUNE PREWARM_SNAPSHOT PREWARM_DELTA PREWARM_DELTA_MAX_AGE PREWARM_STATE_DIR PREWARM_CARGO_M3 PREWARM_MIN_PROFIT_PER_JUMP PREWARM_MIN_RESULTS PREWARM_FALLBACK_MAX_JUMPS PREWARM_FALLBACK_MIN_SECURITY"
 
 {
   echo "SHELL=/bin/sh"
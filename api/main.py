@@ -1,16 +1,47 @@
+import csv
+import gzip
+import hashlib
+import heapq
+import asyncio
+import base64
+import copy
+import io
+import ipaddress
 import json
+import mmap
 import os
+import queue
 import random
+import sqlite3
+import struct
+import sys
 import time
 import threading
 import traceback
+import zlib
+from array import array
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
+from http.client import HTTPConnection, HTTPException as HttpClientError, HTTPSConnection, RemoteDisconnected
+from urllib.parse import urlencode, urlsplit
 from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from urllib.request import Request as UrlRequest, urlopen
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 BASE = "https://esi.evetech.net/latest"
 USER_AGENT = "gutcloud-eve-scan/0.1"
@@ -18,9 +49,50 @@ DEFAULT_START_SYSTEM = 30000142
 
 CACHE_DIR = os.getenv("CACHE_DIR", "/data")
 CACHE_TTL = int(os.getenv("SCAN_CACHE_TTL", "1800"))
-ESI_SLEEP = float(os.getenv("ESI_SLEEP", "0.05"))
+ESI_RATE = float(os.getenv("ESI_RATE", "20"))
+ESI_BURST = int(os.getenv("ESI_BURST", "20"))
+ESI_MIN_RATE = float(os.getenv("ESI_MIN_RATE", "1"))
+ESI_ERROR_LIMIT_SAFE = int(os.getenv("ESI_ERROR_LIMIT_SAFE", "50"))
+ESI_ERROR_LIMIT_FLOOR = int(os.getenv("ESI_ERROR_LIMIT_FLOOR", "10"))
+ESI_BACKOFF_BASE = float(os.getenv("ESI_BACKOFF_BASE", "0.5"))
+ESI_BACKOFF_MAX = float(os.getenv("ESI_BACKOFF_MAX", "30"))
 ESI_RETRIES = int(os.getenv("ESI_RETRIES", "2"))
 ESI_TIMEOUT = int(os.getenv("ESI_TIMEOUT", "30"))
+ESI_TRANSPORT = os.getenv("ESI_TRANSPORT", "pooled").strip().lower()
+ESI_POOL_SIZE = int(os.getenv("ESI_POOL_SIZE", "8"))
+ESI_PAGE_WORKERS = int(os.getenv("ESI_PAGE_WORKERS", "4"))
+ESI_HTTP_CACHE = os.getenv("ESI_HTTP_CACHE", "1").lower() in ("1", "true", "yes")
+ESI_HTTP_CACHE_PREFIXES = [
+    prefix.strip()
+    for prefix in os.getenv("ESI_HTTP_CACHE_PREFIXES", "/markets/").split(",")
+    if prefix.strip()
+]
+ESI_HTTP_CACHE_MAX_AGE = int(os.getenv("ESI_HTTP_CACHE_MAX_AGE", "86400"))
+UNIVERSE_GRAPH_PATH = os.getenv("UNIVERSE_GRAPH_PATH", os.path.join(CACHE_DIR, "universe_graph.bin"))
+NEARBY_CACHE_MAX_ENTRIES = int(os.getenv("NEARBY_CACHE_MAX_ENTRIES", "64"))
+TYPES_CACHE_TTL = int(os.getenv("TYPES_CACHE_TTL", "21600"))
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "128"))
+SCAN_MAX_RUNTIME = int(os.getenv("SCAN_MAX_RUNTIME", "30"))
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "2"))
+SCAN_JOB_QUEUE_MAX = int(os.getenv("SCAN_JOB_QUEUE_MAX", "32"))
+SCAN_JOB_USER_MAX = int(os.getenv("SCAN_JOB_USER_MAX", "2"))
+SCAN_JOB_RETENTION = int(os.getenv("SCAN_JOB_RETENTION", "900"))
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(value.strip(), strict=False)
+    for value in os.getenv("TRUSTED_PROXIES", "").split(",")
+    if value.strip()
+]
+SCAN_STREAM_KEEPALIVE = float(os.getenv("SCAN_STREAM_KEEPALIVE", "15"))
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+SCAN_SNAPSHOT = os.getenv("SCAN_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+SCAN_VECTORIZED = os.getenv("SCAN_VECTORIZED", "0").lower() in ("1", "true", "yes")
+MARKET_SNAPSHOT_FILES = os.getenv("MARKET_SNAPSHOT_FILES", "1").lower() in ("1", "true", "yes")
+MARKET_SNAPSHOT_DIR = os.getenv("MARKET_SNAPSHOT_DIR", os.path.join(CACHE_DIR, "snapshots"))
+MARKET_SNAPSHOT_TTL = int(os.getenv("MARKET_SNAPSHOT_TTL", "300"))
+SCAN_PRUNE = os.getenv("SCAN_PRUNE", "0").lower() in ("1", "true", "yes")
+SCAN_PRUNE_TTL = int(os.getenv("SCAN_PRUNE_TTL", "10800"))
+SCAN_PRUNE_SLACK = float(os.getenv("SCAN_PRUNE_SLACK", "0.2"))
+TYPE_BOUNDS_PATH = os.getenv("TYPE_BOUNDS_PATH", os.path.join(CACHE_DIR, "type_bounds.json"))
 PREWARM_OUTPUT_DIR = os.getenv("PREWARM_OUTPUT_DIR", "/data/prewarm")
 PREWARM_STATUS_SYSTEMS = [
     name.strip()
@@ -28,12 +100,29 @@ PREWARM_STATUS_SYSTEMS = [
     if name.strip()
 ]
 PREWARM_AGGREGATE_LABEL = os.getenv("PREWARM_AGGREGATE_LABEL", "Any hub")
+OPPORTUNITY_DB = os.getenv("OPPORTUNITY_DB", os.path.join(CACHE_DIR, "opportunities.sqlite3"))
+OPPORTUNITY_PAGE_SIZE = int(os.getenv("OPPORTUNITY_PAGE_SIZE", "100"))
+OPPORTUNITY_PAGE_MAX = int(os.getenv("OPPORTUNITY_PAGE_MAX", "1000"))
+PREWARM_WATCH_INTERVAL = float(os.getenv("PREWARM_WATCH_INTERVAL", "2"))
+PREWARM_EVENTS_KEEPALIVE = float(os.getenv("PREWARM_EVENTS_KEEPALIVE", "25"))
+PREWARM_AGGREGATE_FILE = os.getenv("PREWARM_AGGREGATE_FILE", os.path.join(PREWARM_OUTPUT_DIR, "aggregate.json"))
 
 app = FastAPI()
 
 scan_cache = {}
 scan_cache_lock = threading.Lock()
-cache_file_lock = threading.Lock()
+scan_inflight = {}
+file_cache = {}
+file_cache_lock = threading.Lock()
+_MISSING = object()
+page_executor = None
+page_executor_lock = threading.Lock()
+nearby_cache_lock = threading.Lock()
+universe_graph = None
+universe_graph_mtime = None
+market_snapshot_files = {}
+market_snapshot_files_lock = threading.Lock()
+universe_graph_lock = threading.Lock()
 
 
 def utc_now():
@@ -75,6 +164,128 @@ def load_history(path, limit=10):
     return list(reversed(entries))
 
 
+def load_cached_file(path, parse=None):
+    # Parsed contents are shared between requests until the file's mtime or size
+    # changes, so callers must not mutate what they get back.
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = (path, parse)
+    with file_cache_lock:
+        cached = file_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if parse is None:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+    else:
+        value = parse(path)
+    with file_cache_lock:
+        file_cache[key] = (version, value)
+    return value
+
+
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def payload_variant_paths(path):
+    base = path[:-5] if path.endswith(".json") else path
+    return {
+        "identity": f"{base}.min.json",
+        "gzip": f"{base}.min.json.gz",
+        "br": f"{base}.min.json.br",
+    }
+
+
+def write_payload_variants(path, payload):
+    # Minified and pre-compressed copies of a prewarm file, served as-is by the API.
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+    for encoding, variant_path in payload_variant_paths(path).items():
+        if encoding not in variants:
+            if os.path.exists(variant_path):
+                os.remove(variant_path)
+            continue
+        temp_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(variants[encoding])
+        os.replace(temp_path, variant_path)
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified_or(request, etag, headers, build):
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache", **headers}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=build(), media_type="application/json", headers=headers)
+
+
+def compact_payload_response(request, path, payload):
+    # Fresh prewarm files are served from their pre-compressed variants; stale ones
+    # go through the regular JSON path so the stale flag reflects serve time.
+    variants = payload_variant_paths(path)
+    if payload.get("stale") or not os.path.exists(variants["identity"]):
+        return None
+    accepted = accepted_encodings(request.headers.get("accept-encoding"))
+    encoding = next(
+        (name for name in ("br", "gzip") if name in accepted and os.path.exists(variants[name])),
+        "identity",
+    )
+    tag = hashlib.sha1(f"{os.path.basename(path)}:{payload.get('generated_at')}".encode("utf-8")).hexdigest()[:20]
+    etag = f'"{tag}"' if encoding == "identity" else f'"{tag}-{encoding}"'
+    headers = {"Content-Encoding": encoding} if encoding != "identity" else {}
+    try:
+        return not_modified_or(request, etag, headers, lambda: load_cached_file(variants[encoding], read_file_bytes))
+    except OSError:
+        return None
+
+
+def payload_tag(payload, volatile=("generated_at",)):
+    # Digest of everything except per-request fields, so unchanged data keeps its tag.
+    stable = {key: value for key, value in payload.items() if key not in volatile}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:20]
+
+
+def json_payload_response(request, payload, volatile=("generated_at",)):
+    etag = f'"{payload_tag(payload, volatile)}"'
+    encoding = "gzip" if "gzip" in accepted_encodings(request.headers.get("accept-encoding")) else "identity"
+    headers = {}
+    if encoding == "gzip":
+        etag = f'{etag[:-1]}-gzip"'
+        headers["Content-Encoding"] = "gzip"
+
+    def build():
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return gzip.compress(body, compresslevel=5) if encoding == "gzip" else body
+
+    return not_modified_or(request, etag, headers, build)
+
+
 def prune_cache(now):
     with scan_cache_lock:
         expired = [key for key, entry in scan_cache.items() if now - entry["ts"] > CACHE_TTL]
@@ -82,6 +293,139 @@ def prune_cache(now):
             scan_cache.pop(key, None)
 
 
+def peek_cached_scan(cache_key):
+    with scan_cache_lock:
+        entry = scan_cache.get(cache_key)
+    if entry is None or time.time() - entry["ts"] > CACHE_TTL:
+        return None
+    return entry["payload"], entry["ts"]
+
+
+class SharedCancel:
+    # Cancel flag for a scan that several requests may be waiting on. Each
+    # waiter attaches its own Event, or None if it cannot cancel; the scan only
+    # stops once every waiter has cancelled, and then stays stopped.
+    def __init__(self):
+        self.events = []
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def attach(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def is_set(self):
+        with self.lock:
+            if not self.cancelled and self.events:
+                self.cancelled = all(event is not None and event.is_set() for event in self.events)
+            return self.cancelled
+
+
+def run_cached_scan(cache_key, run, cancel=None):
+    # Returns (payload, cached_ts, status). scan_cache keeps insertion order as
+    # recency, so the first key is the least recently used one. run receives
+    # the SharedCancel of the scan; cancel is this caller's Event, if any.
+    now = time.time()
+    prune_cache(now)
+    with scan_cache_lock:
+        entry = scan_cache.pop(cache_key, None)
+        if entry is not None:
+            scan_cache[cache_key] = entry
+            return entry["payload"], entry["ts"], "hit"
+        flight = scan_inflight.get(cache_key)
+        # A scan its waiters already cancelled would only hand back a partial
+        # payload, so a new request starts over instead of joining it.
+        owner = flight is None or flight[1].is_set()
+        if owner:
+            flight = (Future(), SharedCancel())
+            scan_inflight[cache_key] = flight
+        future, shared_cancel = flight
+        shared_cancel.attach(cancel)
+    if not owner:
+        payload, ts = future.result()
+        return payload, ts, "coalesced"
+
+    def release():
+        if scan_inflight.get(cache_key) is flight:
+            scan_inflight.pop(cache_key)
+
+    try:
+        payload = run(shared_cancel)
+    except BaseException as exc:
+        with scan_cache_lock:
+            release()
+        future.set_exception(exc)
+        raise
+    ts = time.time()
+    with scan_cache_lock:
+        release()
+        # Timed-out scans are handed to whoever waited on them but not kept.
+        if not payload.get("partial"):
+            scan_cache[cache_key] = {"ts": ts, "payload": payload}
+            while len(scan_cache) > SCAN_CACHE_MAX_ENTRIES:
+                scan_cache.pop(next(iter(scan_cache)))
+    future.set_result((payload, ts))
+    return payload, ts, "miss"
+
+
+class DirectoryWatcher:
+    # Polls one directory's entries (name, mtime, size) on a background thread
+    # and bumps version whenever they change; readers only compare integers.
+    def __init__(self, path, interval, suffixes=(".json", ".jsonl")):
+        self.path = path
+        self.interval = interval
+        self.suffixes = suffixes
+        self.version = 0
+        self.signature = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def scan(self):
+        signature = []
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not name.endswith(self.suffixes) or ".min." in name:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    signature.append((name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            pass
+        return sorted(signature)
+
+    def poll(self):
+        signature = self.scan()
+        with self.lock:
+            if signature != self.signature:
+                if self.signature is not None:
+                    self.version += 1
+                self.signature = signature
+            return self.version
+
+    def run(self):
+        while True:
+            self.poll()
+            time.sleep(self.interval)
+
+    def current(self):
+        with self.lock:
+            started = self.thread is not None
+            if not started:
+                self.thread = threading.Thread(target=self.run, name="prewarm-watch", daemon=True)
+        if not started:
+            self.poll()
+            self.thread.start()
+        with self.lock:
+            return self.version
+
+
+prewarm_watcher = DirectoryWatcher(PREWARM_OUTPUT_DIR, PREWARM_WATCH_INTERVAL)
+
+
 def prewarm_key(value):
     cleaned = "".join(ch.lower() if ch.isalnum() else "_" for ch in str(value))
     cleaned = cleaned.strip("_")
@@ -92,59 +436,606 @@ def prewarm_path(key):
     return os.path.join(PREWARM_OUTPUT_DIR, f"{key}.json")
 
 
-def load_prewarm_payload(start_system):
+def prewarm_payload_path(start_system):
     key = str(start_system)
     if not key.isdigit():
         key = prewarm_key(key)
-    path = prewarm_path(key)
+    return prewarm_path(key)
+
+
+def load_prewarm_payload(start_system):
+    path = prewarm_payload_path(start_system)
     if not os.path.exists(path):
         return None
-    with open(path, "r", encoding="utf-8") as f:
-        payload = json.load(f)
+    payload = load_cached_file(path)
     now = time.time()
     expires_ts = payload.get("expires_ts")
-    if expires_ts is not None:
-        payload["stale"] = now > expires_ts
-    else:
-        payload["stale"] = False
-    payload["cached"] = True
-    payload["prewarmed"] = True
-    return payload
+    return {
+        **payload,
+        "stale": now > expires_ts if expires_ts is not None else False,
+        "cached": True,
+        "prewarmed": True,
+    }
+
+
+def build_prewarm_aggregate(payloads, label=None):
+    combined = []
+    for payload in payloads:
+        for mode_key in ("instant", "list"):
+            for row in payload.get("results", {}).get(mode_key, []):
+                combined.append({
+                    **row,
+                    "origin_system_id": row.get("origin_system_id") or payload.get("start_system_id"),
+                    "origin_system_name": row.get("origin_system_name") or payload.get("start_system_name"),
+                    "origin_generated_at": row.get("origin_generated_at") or payload.get("generated_at"),
+                    "origin_cache_expires_at": row.get("origin_cache_expires_at") or payload.get("cache_expires_at"),
+                })
+    # Hubs listed under both a name and an id produce the same rows; keep the first.
+    combined.sort(key=lambda row: -(row.get("est_profit_budget") or 0))
+    seen = set()
+    rows = []
+    for row in combined:
+        key = (
+            row.get("mode"),
+            row.get("type_id"),
+            row.get("origin_system_id"),
+            row.get("best_buy_system") or row.get("best_sell_system"),
+        )
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(row)
+
+    expiries = [payload["expires_ts"] for payload in payloads if payload.get("expires_ts") is not None]
+    expires_ts = min(expiries) if expiries else None
+    return {
+        "generated_at": utc_now(),
+        "start_system_name": label or PREWARM_AGGREGATE_LABEL,
+        "hubs": [payload.get("start_system_name") for payload in payloads],
+        "cache_expires_at": ts_to_utc(expires_ts) if expires_ts is not None else None,
+        "expires_ts": expires_ts,
+        "cached": True,
+        "prewarmed": True,
+        "results": {
+            "instant": [row for row in rows if row.get("mode") == "instant"],
+            "list": [row for row in rows if row.get("mode") == "list"],
+        },
+    }
+
+
+def header_value(headers, name, default=None):
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return default
+
+
+def parse_http_date(value):
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def decode_content(headers, raw):
+    encoding = (header_value(headers, "Content-Encoding") or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(raw)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(raw)
+        except zlib.error:
+            return zlib.decompress(raw, -zlib.MAX_WBITS)
+    return raw
+
+
+class UrllibTransport:
+    def request(self, method, url, body=None, headers=None, timeout=30):
+        headers = {"Accept-Encoding": "gzip", **(headers or {})}
+        req = UrlRequest(url, data=body, headers=headers, method=method)
+        try:
+            with urlopen(req, timeout=timeout) as resp:
+                resp_headers = dict(resp.headers)
+                raw = resp.read()
+                status = resp.status
+        except HTTPError as exc:
+            if exc.code != 304:
+                raise
+            return 304, dict(exc.headers), b""
+        return status, resp_headers, decode_content(resp_headers, raw)
+
+    def close(self):
+        pass
+
+
+class PooledTransport:
+    # A connection that sat idle in the pool may have been closed by the server;
+    # only these errors on such a connection are worth retrying on a fresh one.
+    STALE_ERRORS = (RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, pool_size=8):
+        self.pool_size = max(1, int(pool_size))
+        self.pools = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def _pool(self, key):
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = queue.LifoQueue(maxsize=self.pool_size)
+                self.pools[key] = pool
+            return pool
+
+    def _slot(self, key):
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.pool_size)
+                self.slots[key] = slot
+            return slot
+
+    def _acquire(self, key, timeout):
+        try:
+            return self._pool(key).get_nowait(), True
+        except queue.Empty:
+            pass
+        scheme, host, port = key
+        conn_cls = HTTPSConnection if scheme == "https" else HTTPConnection
+        return conn_cls(host, port, timeout=timeout), False
+
+    def _release(self, key, conn):
+        try:
+            self._pool(key).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=30):
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        headers = {"Accept-Encoding": "gzip", "Connection": "keep-alive", **(headers or {})}
+
+        # At most pool_size requests per host are in flight; the rest wait here.
+        slot = self._slot(key)
+        with slot:
+            while True:
+                conn, reused = self._acquire(key, timeout)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    # An open keep-alive socket keeps the timeout it connected with.
+                    conn.sock.settimeout(timeout)
+                try:
+                    conn.request(method, target, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    raw = resp.read()
+                except (HttpClientError, OSError) as exc:
+                    conn.close()
+                    if reused and isinstance(exc, self.STALE_ERRORS):
+                        continue
+                    raise URLError(exc) from exc
+                resp_headers = dict(resp.getheaders())
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(key, conn)
+                break
+
+        if resp.status >= 400:
+            raise HTTPError(url, resp.status, resp.reason, resp.msg, io.BytesIO(raw))
+        return resp.status, resp_headers, decode_content(resp_headers, raw)
+
+    def close(self):
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools = {}
+            self.slots = {}
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate=20.0,
+        burst=20,
+        min_rate=1.0,
+        error_limit_safe=50,
+        error_limit_floor=10,
+        backoff_base=0.5,
+        backoff_max=30.0,
+    ):
+        self.max_rate = max(float(rate), 0.001)
+        self.rate = self.max_rate
+        self.burst = max(1, int(burst))
+        self.min_rate = min(max(float(min_rate), 0.001), self.max_rate)
+        self.error_limit_safe = error_limit_safe
+        self.error_limit_floor = error_limit_floor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"waits": 0, "wait_sec": 0.0, "pauses": 0}
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    wait = (1.0 - self.tokens) / self.rate
+                self.counters["waits"] += 1
+                self.counters["wait_sec"] += wait
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        if seconds <= 0:
+            return
+        with self.lock:
+            until = time.monotonic() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                self.counters["pauses"] += 1
+            self.tokens = 0.0
+
+    def observe(self, headers):
+        remain = header_value(headers, "X-ESI-Error-Limit-Remain")
+        reset = header_value(headers, "X-ESI-Error-Limit-Reset")
+        try:
+            remain = int(remain)
+        except (TypeError, ValueError):
+            return
+        try:
+            reset = int(reset)
+        except (TypeError, ValueError):
+            reset = 0
+        if remain <= self.error_limit_floor:
+            print(f"ESI error budget low ({remain} left), pausing {reset}s", flush=True)
+            self.pause(reset + 1)
+        with self.lock:
+            if remain >= self.error_limit_safe:
+                self.rate = self.max_rate
+            else:
+                share = max(remain, 0) / float(self.error_limit_safe)
+                self.rate = max(self.min_rate, self.max_rate * share)
+
+    def retry_after(self, code, headers):
+        if code == 420:
+            value = header_value(headers, "X-ESI-Error-Limit-Reset")
+        else:
+            value = header_value(headers, "Retry-After")
+        try:
+            return max(1.0, float(value))
+        except (TypeError, ValueError):
+            return self.backoff_max
+
+    def backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2.0, delay)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "waits": self.counters["waits"],
+                "wait_sec": round(self.counters["wait_sec"], 3),
+                "pauses": self.counters["pauses"],
+            }
+
+
+class HttpCache:
+    CACHED_HEADERS = ("X-Pages", "ETag", "Expires", "Last-Modified")
+
+    def __init__(self, root, prefixes=None, max_age=86400):
+        self.root = root
+        self.prefixes = list(prefixes or [])
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0, "misses": 0, "revalidations": 0, "not_modified": 0, "stores": 0}
+
+    def accepts(self, path):
+        return any(path.startswith(prefix) for prefix in self.prefixes)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def snapshot_counters(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def stats_since(self, token):
+        with self.lock:
+            stats = {key: value - token.get(key, 0) for key, value in self.counters.items()}
+        lookups = stats["lookups"]
+        revalidations = stats["revalidations"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["revalidation_rate"] = round(revalidations / lookups, 4) if lookups else 0.0
+        stats["not_modified_rate"] = round(stats["not_modified"] / revalidations, 4) if revalidations else 0.0
+        return stats
+
+    def entry_path(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.entry")
+
+    def load(self, url):
+        path = self.entry_path(url)
+        try:
+            with open(path, "rb") as f:
+                meta_line = f.readline()
+                body = f.read()
+            meta = json.loads(meta_line.decode("utf-8"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        meta["body"] = body
+        return meta
+
+    def store(self, url, headers, body, now=None):
+        now = time.time() if now is None else now
+        kept = {}
+        for name in self.CACHED_HEADERS:
+            value = header_value(headers, name)
+            if value is not None:
+                kept[name] = value
+        expires_ts = parse_http_date(kept.get("Expires"))
+        meta = {
+            "url": url,
+            "stored_ts": now,
+            "expires_ts": expires_ts if expires_ts is not None else now,
+            "headers": kept,
+        }
+        path = self.entry_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(json.dumps(meta, sort_keys=True).encode("utf-8"))
+            f.write(b"\n")
+            f.write(body)
+        os.replace(temp_path, path)
+        self.count("stores")
+        meta["body"] = body
+        return meta
+
+    def refresh(self, url, entry, headers):
+        merged = dict(entry.get("headers", {}))
+        for name in self.CACHED_HEADERS:
+            value = header_value(headers, name)
+            if value is not None:
+                merged[name] = value
+        return self.store(url, merged, entry["body"])
+
+    def conditional_headers(self, entry):
+        headers = {}
+        cached = entry.get("headers", {})
+        if cached.get("ETag"):
+            headers["If-None-Match"] = cached["ETag"]
+        if cached.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached["Last-Modified"]
+        return headers
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if now - os.path.getmtime(path) > self.max_age:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+
+def make_transport(kind=None, pool_size=None):
+    kind = (kind or ESI_TRANSPORT).strip().lower()
+    if kind == "urllib":
+        return UrllibTransport()
+    if kind == "pooled":
+        return PooledTransport(pool_size if pool_size is not None else ESI_POOL_SIZE)
+    raise ValueError(f"Unknown ESI transport: {kind}")
+
+
+esi_limiter = RateLimiter(
+    rate=ESI_RATE,
+    burst=ESI_BURST,
+    min_rate=ESI_MIN_RATE,
+    error_limit_safe=ESI_ERROR_LIMIT_SAFE,
+    error_limit_floor=ESI_ERROR_LIMIT_FLOOR,
+    backoff_base=ESI_BACKOFF_BASE,
+    backoff_max=ESI_BACKOFF_MAX,
+)
+
+
+class EsiStore:
+    KINDS = ("systems", "constellations", "stargates", "names", "types")
+
+    def __init__(self, path, legacy_path=None, flush_every=200):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.flush_every = flush_every
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.loaded = {kind: {} for kind in self.KINDS}
+        self.pending = {}
+        self.ready = False
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        self.local.conn = conn
+        with self.lock:
+            ready = self.ready
+            self.ready = True
+        if not ready:
+            self._import_legacy(conn)
+        return conn
+
+    def _import_legacy(self, conn):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        if conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        rows = [
+            (kind, str(key), json.dumps(value))
+            for kind in self.KINDS
+            for key, value in (data.get(kind) or {}).items()
+        ]
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO entries (kind, key, value) VALUES (?, ?, ?)", rows)
+
+    def get(self, kind, key, default=None):
+        key = str(key)
+        with self.lock:
+            loaded = self.loaded[kind]
+            if key in loaded:
+                return loaded[key]
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is None:
+            return default
+        value = json.loads(row[0])
+        with self.lock:
+            self.loaded[kind][key] = value
+        return value
+
+    def contains(self, kind, key):
+        return self.get(kind, key, _MISSING) is not _MISSING
+
+    def put(self, kind, key, value):
+        key = str(key)
+        with self.lock:
+            self.loaded[kind][key] = value
+            self.pending[(kind, key)] = value
+            flush = len(self.pending) >= self.flush_every
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+        if not pending:
+            return
+        rows = [(kind, key, json.dumps(value)) for (kind, key), value in pending.items()]
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO entries (kind, key, value) VALUES (?, ?, ?)", rows)
+
+    def clear(self):
+        with self.lock:
+            self.loaded = {kind: {} for kind in self.KINDS}
+            self.pending = {}
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries")
+
+
+class StoreTable:
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+
+    def __contains__(self, key):
+        return self.store.contains(self.kind, key)
+
+    def __getitem__(self, key):
+        value = self.store.get(self.kind, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.put(self.kind, key, value)
+
+    def get(self, key, default=None):
+        return self.store.get(self.kind, key, default)
 
 
 class EsiClient:
-    def __init__(self, cache_path, sleep_seconds=0.05, retries=2, timeout=30):
+    def __init__(
+        self,
+        cache_path,
+        retries=2,
+        timeout=30,
+        transport=None,
+        http_cache=None,
+        limiter=None,
+        legacy_cache_path=None,
+    ):
         self.cache_path = cache_path
-        self.sleep_seconds = sleep_seconds
+        self.store = EsiStore(cache_path, legacy_path=legacy_cache_path) if cache_path else None
+        self.limiter = limiter or esi_limiter
         self.retries = retries
         self.timeout = timeout
+        self.transport = transport or make_transport()
+        self.http_cache = http_cache
         self.cache = self._load_cache()
+        self.memo = None
+        self.memo_lock = threading.Lock()
+        self.inflight = {}
+        self.memo_counters = {"hits": 0, "misses": 0, "coalesced": 0}
 
     def _load_cache(self):
-        if not self.cache_path or not os.path.exists(self.cache_path):
-            return {
-                "systems": {},
-                "constellations": {},
-                "stargates": {},
-                "names": {},
-                "types": {},
-            }
-        with open(self.cache_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        data.setdefault("systems", {})
-        data.setdefault("constellations", {})
-        data.setdefault("stargates", {})
-        data.setdefault("names", {})
-        data.setdefault("types", {})
-        return data
+        if self.store is None:
+            return {kind: {} for kind in EsiStore.KINDS}
+        return {kind: StoreTable(self.store, kind) for kind in EsiStore.KINDS}
 
     def save_cache(self):
-        if not self.cache_path:
+        if self.store is None:
+            return
+        self.store.flush()
+
+    def clear_cache(self):
+        if self.store is not None:
+            self.store.clear()
             return
-        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
-        with cache_file_lock:
-            with open(self.cache_path, "w", encoding="utf-8") as f:
-                json.dump(self.cache, f, indent=2, sort_keys=True)
+        for table in self.cache.values():
+            table.clear()
 
     def _fetch_json(self, path, params=None, method="GET", body=None):
         if params:
@@ -154,13 +1045,36 @@ class EsiClient:
         headers = {"User-Agent": USER_AGENT}
         if method == "POST":
             headers["Content-Type"] = "application/json"
+        http_cache = self.http_cache
+        if method != "GET" or http_cache is None or not http_cache.accepts(path):
+            http_cache = None
+        cache_entry = None
+        if http_cache is not None:
+            http_cache.count("lookups")
+            cache_entry = http_cache.load(url)
+            if cache_entry is not None and cache_entry["expires_ts"] > time.time():
+                http_cache.count("hits")
+                return json.loads(cache_entry["body"].decode("utf-8")), dict(cache_entry["headers"])
+            if cache_entry is not None:
+                http_cache.count("revalidations")
+                headers.update(http_cache.conditional_headers(cache_entry))
+            else:
+                http_cache.count("misses")
         for attempt in range(self.retries + 1):
+            self.limiter.acquire()
             try:
-                req = Request(url, data=body, headers=headers, method=method)
-                with urlopen(req, timeout=self.timeout) as resp:
-                    payload = json.loads(resp.read().decode("utf-8"))
-                    resp_headers = dict(resp.headers)
-                time.sleep(self.sleep_seconds)
+                status, resp_headers, raw = self.transport.request(
+                    method, url, body=body, headers=headers, timeout=self.timeout
+                )
+                self.limiter.observe(resp_headers)
+                if status == 304 and cache_entry is not None:
+                    http_cache.count("not_modified")
+                    cache_entry = http_cache.refresh(url, cache_entry, resp_headers)
+                    raw = cache_entry["body"]
+                    resp_headers = {**resp_headers, **cache_entry["headers"]}
+                elif http_cache is not None:
+                    http_cache.store(url, resp_headers, raw)
+                payload = json.loads(raw.decode("utf-8"))
                 return payload, resp_headers
             except HTTPError as exc:
                 print(f"ESI HTTP error {exc.code} for {url}", flush=True)
@@ -170,22 +1084,74 @@ class EsiClient:
                     detail = ""
                 if detail:
                     print(f"ESI error body: {detail}", flush=True)
+                exc_headers = exc.headers or {}
+                self.limiter.observe(exc_headers)
+                if exc.code in (420, 429):
+                    self.limiter.pause(self.limiter.retry_after(exc.code, exc_headers))
+                elif exc.code < 500:
+                    raise
                 if attempt >= self.retries:
                     raise
-                time.sleep(self.sleep_seconds * (attempt + 1))
+                if exc.code >= 500:
+                    time.sleep(self.limiter.backoff(attempt))
             except URLError as exc:
                 print(f"ESI URL error for {url}: {exc}", flush=True)
                 if attempt >= self.retries:
                     raise
-                time.sleep(self.sleep_seconds * (attempt + 1))
+                time.sleep(self.limiter.backoff(attempt))
             except Exception:
                 if attempt >= self.retries:
                     raise
-                time.sleep(self.sleep_seconds * (attempt + 1))
+                time.sleep(self.limiter.backoff(attempt))
         return None, {}
 
+    def scoped(self):
+        # A view of this client for one scan. It shares the caches, connections
+        # and in-flight requests, but memoizes GETs in a dict of its own that is
+        # dropped with the view, and counts only its own traffic.
+        view = copy.copy(self)
+        view.memo = {}
+        view.memo_counters = {"hits": 0, "misses": 0, "coalesced": 0}
+        return view
+
+    def memo_stats(self):
+        with self.memo_lock:
+            stats = dict(self.memo_counters)
+        requests = stats["hits"] + stats["misses"] + stats["coalesced"]
+        saved = stats["hits"] + stats["coalesced"]
+        stats["hit_rate"] = round(saved / requests, 4) if requests else 0.0
+        return stats
+
     def get_json(self, path, params=None):
-        return self._fetch_json(path, params=params, method="GET")
+        key = (path, tuple(sorted((params or {}).items())))
+        with self.memo_lock:
+            if self.memo is not None and key in self.memo:
+                self.memo_counters["hits"] += 1
+                return self.memo[key]
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[key] = future
+                self.memo_counters["misses"] += 1
+            else:
+                self.memo_counters["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._fetch_json(path, params=params, method="GET")
+        except BaseException as exc:
+            with self.memo_lock:
+                self.inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+        with self.memo_lock:
+            if self.memo is not None:
+                self.memo[key] = result
+            self.inflight.pop(key, None)
+        future.set_result(result)
+        return result
 
     def post_json(self, path, body):
         data = json.dumps(body).encode("utf-8")
@@ -243,10 +1209,15 @@ class EsiClient:
 
 
 client = EsiClient(
-    cache_path=os.path.join(CACHE_DIR, "esi_cache.json"),
-    sleep_seconds=ESI_SLEEP,
+    cache_path=os.getenv("ESI_CACHE_DB", os.path.join(CACHE_DIR, "esi_cache.sqlite3")),
+    legacy_cache_path=os.path.join(CACHE_DIR, "esi_cache.json"),
     retries=ESI_RETRIES,
     timeout=ESI_TIMEOUT,
+    http_cache=HttpCache(
+        os.path.join(CACHE_DIR, "http_cache"),
+        prefixes=ESI_HTTP_CACHE_PREFIXES,
+        max_age=ESI_HTTP_CACHE_MAX_AGE,
+    ) if ESI_HTTP_CACHE else None,
 )
 
 
@@ -285,6 +1256,11 @@ def make_cache_key(
     broker_pct,
     limit,
     max_runtime,
+    sample_seed=None,
+    home_order_pages=None,
+    cargo_m3=None,
+    min_profit_per_jump=None,
+    min_results=None,
 ):
     return json.dumps({
         "start_system": start_system,
@@ -301,12 +1277,239 @@ def make_cache_key(
         "broker_pct": broker_pct,
         "limit": limit,
         "max_runtime": max_runtime,
+        "sample_seed": sample_seed,
+        "home_order_pages": home_order_pages,
+        "cargo_m3": cargo_m3,
+        "min_profit_per_jump": min_profit_per_jump,
+        "min_results": min_results,
     }, sort_keys=True)
 
 
-def build_nearby_systems(client_ref, start_system_id, max_jumps, min_security, deadline=None):
-    visited = {start_system_id: 0}
-    queue = deque([start_system_id])
+class UniverseGraph:
+    MAGIC = b"EVEUG1\0\0"
+    HEADER = struct.Struct("<8sIII")
+
+    def __init__(self, system_ids, constellations, regions, security, offsets, neighbors, names):
+        self.system_ids = system_ids
+        self.constellations = constellations
+        self.regions = regions
+        self.security = security
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.names = names
+        self.index = {system_id: i for i, system_id in enumerate(system_ids)}
+
+    @classmethod
+    def from_systems(cls, systems, edges):
+        ordered = sorted(systems)
+        index = {system_id: i for i, system_id in enumerate(ordered)}
+        adjacency = [set() for _ in ordered]
+        for src, dest in edges:
+            if src in index and dest in index and src != dest:
+                adjacency[index[src]].add(index[dest])
+        offsets = array("i", [0])
+        neighbors = array("i")
+        for targets in adjacency:
+            neighbors.extend(sorted(targets))
+            offsets.append(len(neighbors))
+        return cls(
+            array("i", ordered),
+            array("i", (systems[s]["constellation_id"] or 0 for s in ordered)),
+            array("i", (systems[s]["region_id"] or 0 for s in ordered)),
+            array("d", (float(systems[s]["security"] or 0.0) for s in ordered)),
+            offsets,
+            neighbors,
+            [systems[s].get("name") or str(s) for s in ordered],
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, count, edge_count, names_len = cls.HEADER.unpack_from(data, 0)
+        if magic != cls.MAGIC:
+            raise ValueError(f"Not a universe graph file: {path}")
+        pos = cls.HEADER.size
+
+        def take(typecode, length):
+            nonlocal pos
+            values = array(typecode)
+            size = values.itemsize * length
+            values.frombytes(data[pos:pos + size])
+            if sys.byteorder != "little":
+                values.byteswap()
+            pos += size
+            return values
+
+        system_ids = take("i", count)
+        constellations = take("i", count)
+        regions = take("i", count)
+        security = take("d", count)
+        offsets = take("i", count + 1)
+        neighbors = take("i", edge_count)
+        names = data[pos:pos + names_len].decode("utf-8").split("\n") if count else []
+        return cls(system_ids, constellations, regions, security, offsets, neighbors, names)
+
+    def save(self, path):
+        names = "\n".join(self.names).encode("utf-8")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self.system_ids), len(self.neighbors), len(names)))
+            for values in (
+                self.system_ids,
+                self.constellations,
+                self.regions,
+                self.security,
+                self.offsets,
+                self.neighbors,
+            ):
+                if sys.byteorder != "little":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                f.write(values.tobytes())
+            f.write(names)
+        os.replace(temp_path, path)
+
+    def __contains__(self, system_id):
+        return system_id in self.index
+
+    def system_info(self, system_id):
+        i = self.index.get(system_id)
+        if i is None:
+            return None
+        return {
+            "name": self.names[i],
+            "security": self.security[i],
+            "constellation_id": self.constellations[i] or None,
+            "region_id": self.regions[i] or None,
+        }
+
+    def nearby(self, start_system_id, max_jumps, min_security):
+        start = self.index[start_system_id]
+        depth = {start: 0}
+        queue = deque([start])
+        offsets = self.offsets
+        neighbors = self.neighbors
+        while queue:
+            i = queue.popleft()
+            d = depth[i]
+            if d >= max_jumps:
+                continue
+            for j in neighbors[offsets[i]:offsets[i + 1]]:
+                if j not in depth:
+                    depth[j] = d + 1
+                    queue.append(j)
+
+        systems = {}
+        region_to_systems = {}
+        for i, jumps in depth.items():
+            sec = self.security[i]
+            if sec < min_security:
+                continue
+            system_id = self.system_ids[i]
+            reg_id = self.regions[i] or None
+            systems[system_id] = {
+                "name": self.names[i],
+                "security": sec,
+                "region_id": reg_id,
+                "jumps": jumps,
+            }
+            if reg_id is not None:
+                region_to_systems.setdefault(reg_id, set()).add(system_id)
+        return systems, region_to_systems
+
+
+def get_universe_graph(path=None):
+    global universe_graph, universe_graph_mtime
+    path = path or UNIVERSE_GRAPH_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with universe_graph_lock:
+        if universe_graph is None or universe_graph_mtime != mtime:
+            try:
+                universe_graph = UniverseGraph.load(path)
+            except (OSError, ValueError, struct.error) as exc:
+                print(f"Universe graph unavailable: {exc}", flush=True)
+                return None
+            universe_graph_mtime = mtime
+        return universe_graph
+
+
+def crawl_universe_graph(client_ref, workers=8):
+    system_ids, _ = client_ref.get_json("/universe/systems/")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        system_data = dict(zip(system_ids, executor.map(client_ref.get_system, system_ids)))
+        gate_ids = [
+            gate_id
+            for data in system_data.values()
+            for gate_id in (data.get("stargates") or [])
+        ]
+        gates = list(executor.map(client_ref.get_stargate, gate_ids))
+        const_ids = sorted({
+            data.get("constellation_id")
+            for data in system_data.values()
+            if data.get("constellation_id") is not None
+        })
+        const_regions = {
+            const_id: (data or {}).get("region_id")
+            for const_id, data in zip(const_ids, executor.map(client_ref.get_constellation, const_ids))
+        }
+    client_ref.save_cache()
+
+    systems = {}
+    for system_id, data in system_data.items():
+        const_id = data.get("constellation_id")
+        systems[system_id] = {
+            "name": data.get("name"),
+            "security": data.get("security_status", 0.0),
+            "constellation_id": const_id,
+            "region_id": const_regions.get(const_id),
+        }
+    edges = []
+    for gate in gates:
+        src = (gate or {}).get("system_id")
+        dest = (gate or {}).get("destination", {}).get("system_id")
+        if src is not None and dest is not None:
+            edges.append((src, dest))
+    return UniverseGraph.from_systems(systems, edges)
+
+
+def load_sde_universe_graph(sde_dir):
+    systems = {}
+    with open(os.path.join(sde_dir, "mapSolarSystems.csv"), "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            system_id = int(row["solarSystemID"])
+            systems[system_id] = {
+                "name": row.get("solarSystemName"),
+                "security": float(row.get("security") or 0.0),
+                "constellation_id": int(row["constellationID"]),
+                "region_id": int(row["regionID"]),
+            }
+    edges = []
+    with open(os.path.join(sde_dir, "mapSolarSystemJumps.csv"), "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            edges.append((int(row["fromSolarSystemID"]), int(row["toSolarSystemID"])))
+    return UniverseGraph.from_systems(systems, edges)
+
+
+def build_nearby_systems(client_ref, start_system_id, max_jumps, min_security, deadline=None, visited=None):
+    graph = get_universe_graph()
+    if graph is not None and start_system_id in graph:
+        systems, region_to_systems = graph.nearby(start_system_id, max_jumps, min_security)
+        return systems, region_to_systems, False
+
+    if visited:
+        # Resume a finished, shallower BFS from its outermost ring.
+        frontier_depth = max(visited.values())
+        queue = deque(sorted(system_id for system_id, depth in visited.items() if depth == frontier_depth))
+    else:
+        if visited is None:
+            visited = {}
+        visited[start_system_id] = 0
+        queue = deque([start_system_id])
     timed_out = False
 
     while queue:
@@ -330,6 +1533,8 @@ def build_nearby_systems(client_ref, start_system_id, max_jumps, min_security, d
     systems = {}
     region_to_systems = {}
     for system_id, jumps in visited.items():
+        if jumps > max_jumps:
+            continue
         sys_data = client_ref.get_system(system_id)
         sec = sys_data.get("security_status", 0.0)
         if sec < min_security:
@@ -350,28 +1555,67 @@ def build_nearby_systems(client_ref, start_system_id, max_jumps, min_security, d
     return systems, region_to_systems, timed_out
 
 
-def load_nearby_cache(path, start_system_id, max_jumps, min_security):
+def read_nearby_entries(path):
     if not path or not os.path.exists(path):
-        return None
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if (
-        data.get("start_system_id") != start_system_id
-        or data.get("max_jumps") != max_jumps
-        or data.get("min_security") != min_security
-    ):
-        return None
-    systems = {int(k): v for k, v in data.get("systems", {}).items()}
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if "entries" in data:
+        return data.get("entries") or []
+    if "start_system_id" in data:
+        return [data]
+    return []
+
+
+def filter_nearby(systems, max_jumps, min_security):
+    filtered = {}
     region_to_systems = {}
-    for region_id, system_ids in data.get("region_to_systems", {}).items():
-        region_to_systems[int(region_id)] = set(system_ids)
-    return systems, region_to_systems
+    for system_id, info in systems.items():
+        if info.get("jumps", 0) > max_jumps or info.get("security", 0.0) < min_security:
+            continue
+        filtered[system_id] = info
+        reg_id = info.get("region_id")
+        if reg_id is not None:
+            region_to_systems.setdefault(reg_id, set()).add(system_id)
+    return filtered, region_to_systems
+
+
+def load_nearby_cache(path, start_system_id, max_jumps, min_security):
+    best = None
+    for entry in read_nearby_entries(path):
+        if entry.get("start_system_id") != start_system_id:
+            continue
+        entry_jumps = entry.get("max_jumps")
+        entry_security = entry.get("min_security")
+        if entry_jumps is None or entry_security is None:
+            continue
+        if entry_jumps < max_jumps or entry_security > min_security:
+            continue
+        if entry_jumps == max_jumps and entry_security == min_security:
+            best = entry
+            break
+        if best is None or len(entry.get("systems", {})) < len(best.get("systems", {})):
+            best = entry
+    if best is None:
+        return None
+    systems = {int(k): v for k, v in best.get("systems", {}).items()}
+    if best.get("max_jumps") == max_jumps and best.get("min_security") == min_security:
+        region_to_systems = {}
+        for region_id, system_ids in best.get("region_to_systems", {}).items():
+            region_to_systems[int(region_id)] = set(system_ids)
+        return systems, region_to_systems
+    # BFS distances do not depend on the security filter, so a wider cached
+    # search can be narrowed down without walking the graph again.
+    return filter_nearby(systems, max_jumps, min_security)
 
 
 def save_nearby_cache(path, start_system_id, max_jumps, min_security, systems, region_to_systems):
     if not path:
         return
-    payload = {
+    entry = {
         "generated_at": utc_now(),
         "start_system_id": start_system_id,
         "max_jumps": max_jumps,
@@ -382,65 +1626,492 @@ def save_nearby_cache(path, start_system_id, max_jumps, min_security, systems, r
             for region_id, system_ids in region_to_systems.items()
         },
     }
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, sort_keys=True)
+    with nearby_cache_lock:
+        entries = []
+        for existing in read_nearby_entries(path):
+            if existing.get("start_system_id") == start_system_id and (
+                existing.get("max_jumps", 0) <= max_jumps
+                and existing.get("min_security", 0.0) >= min_security
+            ):
+                continue
+            entries.append(existing)
+        entries.append(entry)
+        entries = entries[-NEARBY_CACHE_MAX_ENTRIES:]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f, sort_keys=True)
+        os.replace(temp_path, path)
 
 
-def get_region_types(client_ref, region_id, max_pages=0, cache_path=None, refresh=False):
-    if cache_path and os.path.exists(cache_path) and not refresh:
-        with open(cache_path, "r", encoding="utf-8") as f:
-            cached = json.load(f)
-            if cached.get("region_id") == region_id:
-                return cached.get("types", [])
+def load_types_cache(path):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    types = []
-    page = 1
-    while True:
-        payload, headers = client_ref.get_json(f"/markets/{region_id}/types/", {"page": page})
-        types.extend(payload)
-        total_pages = int(headers.get("X-Pages", page))
-        if max_pages and page >= max_pages:
-            break
-        if page >= total_pages:
-            break
-        page += 1
 
-    if cache_path:
-        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "region_id": region_id,
-                "fetched_at": utc_now(),
-                "types": types,
-            }, f, indent=2, sort_keys=True)
+def save_types_cache(path, region_id, fetched_ts, total_pages, pages):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "region_id": region_id,
+            "fetched_at": ts_to_utc(fetched_ts),
+            "fetched_ts": fetched_ts,
+            "total_pages": total_pages,
+            "pages": {str(page): types for page, types in pages.items()},
+        }, f, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def get_region_types(client_ref, region_id, max_pages=0, cache_dir=None, refresh=False, ttl=None):
+    ttl = TYPES_CACHE_TTL if ttl is None else ttl
+    cache_path = os.path.join(cache_dir, f"{region_id}.json") if cache_dir else None
+    cached = None if refresh else load_types_cache(cache_path)
+    now = time.time()
+    if cached is not None and cached.get("region_id") == region_id and now - cached.get("fetched_ts", 0) < ttl:
+        fetched_ts = cached["fetched_ts"]
+        total_pages = int(cached.get("total_pages") or 1)
+        pages = {int(page): types for page, types in (cached.get("pages") or {}).items()}
+        refreshed = False
+    else:
+        # Stale pages are walked again; the HTTP cache turns unchanged ones into 304s.
+        payload, headers = client_ref.get_json(f"/markets/{region_id}/types/", {"page": 1})
+        fetched_ts = now
+        total_pages = int(headers.get("X-Pages", 1))
+        pages = {1: payload or []}
+        refreshed = True
+
+    wanted = min(max_pages, total_pages) if max_pages else total_pages
+    missing = [page for page in range(1, wanted + 1) if page not in pages]
+    if missing:
+        pages.update(fetch_pages(client_ref, f"/markets/{region_id}/types/", missing))
+    if cache_path and (missing or refreshed):
+        save_types_cache(cache_path, region_id, fetched_ts, total_pages, pages)
 
+    types = []
+    for page in range(1, wanted + 1):
+        types.extend(pages.get(page) or [])
     return types
 
 
+def get_page_executor():
+    global page_executor
+    with page_executor_lock:
+        if page_executor is None:
+            page_executor = ThreadPoolExecutor(
+                max_workers=max(1, ESI_PAGE_WORKERS),
+                thread_name_prefix="esi-page",
+            )
+        return page_executor
+
+
+def iter_pages(client_ref, path, params=None, max_pages=0, with_headers=False):
+    params = dict(params or {})
+    payload, headers = client_ref.get_json(path, {**params, "page": 1})
+    yield (payload, headers) if with_headers else payload
+    total_pages = int(headers.get("X-Pages", 1))
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+    if total_pages <= 1:
+        return
+
+    if ESI_PAGE_WORKERS <= 1:
+        for page in range(2, total_pages + 1):
+            payload, headers = client_ref.get_json(path, {**params, "page": page})
+            yield (payload, headers) if with_headers else payload
+        return
+
+    executor = get_page_executor()
+    futures = [
+        executor.submit(client_ref.get_json, path, {**params, "page": page})
+        for page in range(2, total_pages + 1)
+    ]
+    try:
+        for future in futures:
+            payload, headers = future.result()
+            yield (payload, headers) if with_headers else payload
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def fetch_pages(client_ref, path, page_numbers, params=None):
+    params = dict(params or {})
+    if ESI_PAGE_WORKERS <= 1 or len(page_numbers) <= 1:
+        return {page: client_ref.get_json(path, {**params, "page": page})[0] for page in page_numbers}
+    executor = get_page_executor()
+    futures = {
+        page: executor.submit(client_ref.get_json, path, {**params, "page": page})
+        for page in page_numbers
+    }
+    return {page: future.result()[0] for page, future in futures.items()}
+
+
 def iter_region_orders(client_ref, region_id, order_type, type_id, max_pages=0):
-    page = 1
-    while True:
-        payload, headers = client_ref.get_json(
-            f"/markets/{region_id}/orders/",
-            {"order_type": order_type, "type_id": type_id, "page": page},
-        )
+    for payload in iter_pages(
+        client_ref,
+        f"/markets/{region_id}/orders/",
+        {"order_type": order_type, "type_id": type_id},
+        max_pages=max_pages,
+    ):
         if not payload:
             break
         for order in payload:
             yield order
-        total_pages = int(headers.get("X-Pages", page))
-        if max_pages and page >= max_pages:
-            break
-        if page >= total_pages:
+
+
+class MarketSnapshotFile:
+    # One region's orders as fixed-width little-endian columns followed by a JSON
+    # meta block. Readers map the file and view the columns without copying.
+    MAGIC = b"EVEMS1\0\0"
+    HEADER = struct.Struct("<8sQII")
+    COLUMNS = (
+        ("type_id", "q"),
+        ("system_id", "q"),
+        ("region_id", "q"),
+        ("price", "d"),
+        ("volume_remain", "q"),
+        ("is_buy", "b"),
+    )
+
+    def __init__(self, columns, meta):
+        self.columns = columns
+        self.meta = meta
+        self.region_id = meta.get("region_id")
+
+    def __len__(self):
+        return len(self.columns["price"])
+
+    def is_fresh(self, now=None):
+        expires_ts = self.meta.get("expires_ts")
+        return bool(expires_ts) and expires_ts > (now if now is not None else time.time())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        magic, count, meta_length, _ = cls.HEADER.unpack_from(view, 0)
+        if magic != cls.MAGIC:
+            raise ValueError(f"Not a market snapshot file: {path}")
+        pos = cls.HEADER.size
+        columns = {}
+        for name, typecode in cls.COLUMNS:
+            size = count * array(typecode).itemsize
+            if pos + size > len(view):
+                raise ValueError(f"Truncated market snapshot file: {path}")
+            column = view[pos:pos + size].cast(typecode)
+            if sys.byteorder != "little" and column.itemsize > 1:
+                column = array(typecode, column)
+                column.byteswap()
+            columns[name] = column
+            pos += size
+        meta = json.loads(bytes(view[pos:pos + meta_length]).decode("utf-8"))
+        return cls(columns, meta)
+
+    @classmethod
+    def save(cls, path, columns, meta, start=0, end=None):
+        end = len(columns["price"]) if end is None else end
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, end - start, len(meta_bytes), 0))
+            for name, typecode in cls.COLUMNS:
+                values = columns[name][start:end]
+                if sys.byteorder != "little":
+                    values = array(typecode, values)
+                    values.byteswap()
+                f.write(values.tobytes())
+            f.write(meta_bytes)
+        os.replace(temp_path, path)
+
+
+def market_snapshot_path(region_id, snapshot_dir=None):
+    return os.path.join(snapshot_dir or MARKET_SNAPSHOT_DIR, f"{region_id}.bin")
+
+
+def open_market_snapshot(region_id, snapshot_dir=None):
+    # Mapped files are shared across scans until prewarm (or another scan)
+    # replaces them; the old mapping stays valid for anyone still reading it.
+    path = market_snapshot_path(region_id, snapshot_dir)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with market_snapshot_files_lock:
+        cached = market_snapshot_files.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    try:
+        snapshot_file = MarketSnapshotFile.load(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    with market_snapshot_files_lock:
+        market_snapshot_files[path] = (version, snapshot_file)
+    return snapshot_file
+
+
+class OrderSnapshot:
+    def __init__(self):
+        self.index = {}
+        self.index_lock = threading.Lock()
+        self.segments = []
+        self.indexed_segments = 0
+        self.regions = set()
+        self.region_systems = {}
+        self.region_versions = {}
+        self.fingerprints = {}
+        self.columns = {
+            "type_id": array("q"),
+            "system_id": array("q"),
+            "region_id": array("q"),
+            "is_buy": array("b"),
+            "price": array("d"),
+            "volume_remain": array("q"),
+        }
+        self.order_count = 0
+        self.page_count = 0
+
+    def add(self, order, region_id=None):
+        type_id = order.get("type_id")
+        system_id = order.get("system_id")
+        if type_id is None or system_id is None:
+            return
+        key = (type_id, system_id, bool(order.get("is_buy_order")))
+        self.index.setdefault(key, []).append(order)
+        if region_id is not None:
+            self.region_systems.setdefault(region_id, set()).add(system_id)
+            # Order-independent digest of each type's book, compared between prewarm cycles.
+            digest = zlib.crc32(repr((
+                order.get("order_id"),
+                order.get("price"),
+                order.get("volume_remain"),
+                order.get("issued"),
+            )).encode("utf-8"))
+            fingerprints = self.fingerprints.setdefault(region_id, {})
+            fingerprints[type_id] = (fingerprints.get(type_id, 0) + digest) & 0xFFFFFFFFFFFF
+        price = order.get("price")
+        if price is not None:
+            columns = self.columns
+            columns["type_id"].append(int(type_id))
+            columns["system_id"].append(int(system_id))
+            columns["region_id"].append(int(region_id) if region_id is not None else -1)
+            columns["is_buy"].append(1 if order.get("is_buy_order") else 0)
+            columns["price"].append(float(price))
+            columns["volume_remain"].append(int(order.get("volume_remain") or 0))
+        self.order_count += 1
+
+    def attach(self, snapshot_file):
+        meta = snapshot_file.meta
+        region_id = snapshot_file.region_id
+        self.segments.append(snapshot_file.columns)
+        self.region_systems.setdefault(region_id, set()).update(meta.get("systems") or ())
+        self.region_versions[region_id] = meta.get("versions")
+        self.fingerprints[region_id] = {int(k): v for k, v in (meta.get("fingerprints") or {}).items()}
+        self.regions.add(region_id)
+        self.order_count += len(snapshot_file)
+
+    def index_segments(self):
+        with self.index_lock:
+            for columns in self.segments[self.indexed_segments:]:
+                for type_id, system_id, is_buy, price, volume_remain in zip(
+                    columns["type_id"],
+                    columns["system_id"],
+                    columns["is_buy"],
+                    columns["price"],
+                    columns["volume_remain"],
+                ):
+                    self.index.setdefault((type_id, system_id, bool(is_buy)), []).append({
+                        "type_id": type_id,
+                        "system_id": system_id,
+                        "is_buy_order": bool(is_buy),
+                        "price": price,
+                        "volume_remain": volume_remain,
+                    })
+            self.indexed_segments = len(self.segments)
+
+    def orders(self, type_id, system_id, is_buy_order):
+        if self.indexed_segments < len(self.segments):
+            self.index_segments()
+        return self.index.get((type_id, system_id, bool(is_buy_order)), ())
+
+    def column_view(self):
+        # Numpy views over the columns, in the order the orders were added. A
+        # snapshot backed by a single source is viewed without copying.
+        views = {}
+        for name, column in self.columns.items():
+            parts = [
+                np.frombuffer(part, dtype=column.typecode)
+                for part in [column] + [segment[name] for segment in self.segments]
+                if len(part)
+            ]
+            if not parts:
+                views[name] = np.zeros(0, dtype=column.typecode)
+            elif len(parts) == 1:
+                views[name] = parts[0]
+            else:
+                views[name] = np.concatenate(parts)
+        return views
+
+    def stats(self):
+        return {
+            "regions": sorted(self.regions),
+            "pages": self.page_count,
+            "files": len(self.segments),
+            "orders": self.order_count,
+            "keys": len(self.index),
+        }
+
+
+def load_region_snapshot(client_ref, snapshot, region_id, max_pages=0, deadline=None, snapshot_dir=None):
+    persist = bool(snapshot_dir) and not max_pages
+    if persist:
+        snapshot_file = open_market_snapshot(region_id, snapshot_dir)
+        if snapshot_file is not None and snapshot_file.region_id == region_id and snapshot_file.is_fresh():
+            snapshot.attach(snapshot_file)
+            return True
+    start = len(snapshot.columns["price"])
+    etags = []
+    expires = []
+    for payload, headers in iter_pages(
+        client_ref,
+        f"/markets/{region_id}/orders/",
+        {"order_type": "all"},
+        max_pages=max_pages,
+        with_headers=True,
+    ):
+        snapshot.page_count += 1
+        etags.append(header_value(headers, "ETag"))
+        expires.append(parse_http_date(header_value(headers, "Expires")))
+        for order in payload or []:
+            snapshot.add(order, region_id)
+        if deadline and time.monotonic() > deadline:
+            return False
+    snapshot.region_versions[region_id] = etags if all(etags) else None
+    snapshot.regions.add(region_id)
+    if persist:
+        fetched_ts = time.time()
+        known_expires = [value for value in expires if value]
+        try:
+            MarketSnapshotFile.save(
+                market_snapshot_path(region_id, snapshot_dir),
+                snapshot.columns,
+                {
+                    "region_id": region_id,
+                    "fetched_ts": fetched_ts,
+                    "expires_ts": min(known_expires) if known_expires else fetched_ts + MARKET_SNAPSHOT_TTL,
+                    "versions": snapshot.region_versions[region_id],
+                    "fingerprints": snapshot.fingerprints.get(region_id, {}),
+                    "systems": sorted(snapshot.region_systems.get(region_id, ())),
+                },
+                start=start,
+            )
+        except OSError:
+            pass
+    return True
+
+
+def build_order_snapshot(client_ref, region_ids, max_pages=0, deadline=None, snapshot=None, snapshot_dir=None):
+    snapshot = snapshot if snapshot is not None else OrderSnapshot()
+    if snapshot_dir is None and MARKET_SNAPSHOT_FILES:
+        snapshot_dir = MARKET_SNAPSHOT_DIR
+    complete = True
+    for region_id in sorted(region_ids):
+        if region_id in snapshot.regions:
+            continue
+        if not load_region_snapshot(
+            client_ref,
+            snapshot,
+            region_id,
+            max_pages=max_pages,
+            deadline=deadline,
+            snapshot_dir=snapshot_dir,
+        ):
+            complete = False
             break
-        page += 1
+    return snapshot, complete
+
+
+def iter_system_orders(client_ref, region_id, system_ids, order_type, type_id, max_pages=0, snapshot=None):
+    if snapshot is not None:
+        is_buy_order = order_type == "buy"
+        for system_id in system_ids:
+            yield from snapshot.orders(type_id, system_id, is_buy_order)
+        return
+    yield from iter_region_orders(client_ref, region_id, order_type, type_id, max_pages=max_pages)
+
+
+def collect_system_bests(client_ref, region_id, order_type, type_id, max_pages=0, want_highest=False, snapshot=None):
+    if snapshot is not None:
+        system_ids = sorted(snapshot.region_systems.get(region_id, ()))
+    else:
+        system_ids = ()
+    bests = {}
+    for order in iter_system_orders(
+        client_ref, region_id, system_ids, order_type, type_id, max_pages=max_pages, snapshot=snapshot
+    ):
+        sys_id = order.get("system_id")
+        price = order.get("price")
+        if sys_id is None or price is None:
+            continue
+        current = bests.get(sys_id)
+        if current is None or (price > current["price"] if want_highest else price < current["price"]):
+            bests[sys_id] = order
+    return bests
+
+
+def pick_best_order(bests, region_to_systems, want_highest=False):
+    best_price = None
+    best_order = None
+    for region_id in sorted(region_to_systems):
+        for sys_id in sorted(region_to_systems[region_id]):
+            order = bests.get(sys_id)
+            if order is None:
+                continue
+            price = order["price"]
+            if best_price is None or (price > best_price if want_highest else price < best_price):
+                best_price = price
+                best_order = order
+    return best_price, best_order
+
+
+def region_order_bests(
+    client_ref, entry, region_to_systems, order_type, type_id, max_pages=0, snapshot=None, bounds=None
+):
+    # entry caches per-system best orders for every region already fetched, so a
+    # wider follow-up scan only has to fetch the regions it adds.
+    by_region = entry.setdefault(f"{order_type}_bests", {})
+    bests = {}
+    for region_id in sorted(region_to_systems):
+        if region_id not in by_region:
+            by_region[region_id] = collect_system_bests(
+                client_ref,
+                region_id,
+                order_type,
+                type_id,
+                max_pages=max_pages,
+                want_highest=order_type == "buy",
+                snapshot=snapshot,
+            )
+            if bounds is not None:
+                bounds.observe(region_id, type_id, order_type, by_region[region_id])
+        bests.update(by_region[region_id])
+    return bests
 
 
-def find_best_home_sell(client_ref, region_id, system_id, type_id, max_pages=0):
+def find_best_home_sell(client_ref, region_id, system_id, type_id, max_pages=0, snapshot=None):
     best_price = None
     best_vol = 0
-    for order in iter_region_orders(client_ref, region_id, "sell", type_id, max_pages=max_pages):
+    for order in iter_system_orders(
+        client_ref, region_id, (system_id,), "sell", type_id, max_pages=max_pages, snapshot=snapshot
+    ):
         if order.get("system_id") != system_id:
             continue
         price = order.get("price")
@@ -452,50 +2123,263 @@ def find_best_home_sell(client_ref, region_id, system_id, type_id, max_pages=0):
     return best_price, best_vol
 
 
-def find_best_order_in_systems(client_ref, region_to_systems, order_type, type_id, max_pages=0, want_highest=False):
-    best_price = None
-    best_order = None
-    for region_id, system_ids in region_to_systems.items():
-        for order in iter_region_orders(client_ref, region_id, order_type, type_id, max_pages=max_pages):
-            if order.get("system_id") not in system_ids:
-                continue
-            price = order.get("price")
-            if price is None:
+def find_best_order_in_systems(
+    client_ref,
+    region_to_systems,
+    order_type,
+    type_id,
+    max_pages=0,
+    want_highest=False,
+    snapshot=None,
+):
+    bests = {}
+    for region_id in region_to_systems:
+        bests.update(collect_system_bests(
+            client_ref,
+            region_id,
+            order_type,
+            type_id,
+            max_pages=max_pages,
+            want_highest=want_highest,
+            snapshot=snapshot,
+        ))
+    return pick_best_order(bests, region_to_systems, want_highest=want_highest)
+
+
+def find_best_sell_target(client_ref, region_to_systems, type_id, max_pages=0, snapshot=None):
+    lowest_by_system = {}
+    for region_id in region_to_systems:
+        lowest_by_system.update(collect_system_bests(
+            client_ref,
+            region_id,
+            "sell",
+            type_id,
+            max_pages=max_pages,
+            snapshot=snapshot,
+        ))
+    return pick_best_order(lowest_by_system, region_to_systems, want_highest=True)
+
+
+class TypeBounds:
+    # Best target price seen per (region, type, side) in recent scans. With some
+    # slack on top it is an optimistic ceiling: a type whose ceiling cannot make
+    # the cut is skipped before its nearby order books are fetched.
+    def __init__(self, path, ttl, slack):
+        self.path = path
+        self.ttl = ttl
+        self.slack = slack
+        self.entries = {}
+        self.dirty = False
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(region_id, type_id, order_type):
+        return f"{region_id}:{type_id}:{order_type}"
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def merge(self, entries):
+        for key, entry in entries.items():
+            current = self.entries.get(key)
+            if current is None or entry[1] > current[1]:
+                self.entries[key] = entry
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        with self.lock:
+            if mtime == self.loaded_mtime:
+                return
+            self.loaded_mtime = mtime
+            self.merge(self.read())
+
+    def observe(self, region_id, type_id, order_type, bests):
+        # buy bests hold each system's highest bid, sell bests its lowest ask; the
+        # scan picks the highest of either, so that is what bounds the target.
+        price = max((order["price"] for order in bests.values()), default=0.0)
+        with self.lock:
+            self.entries[self.key(region_id, type_id, order_type)] = [price, time.time()]
+            self.dirty = True
+
+    def ceiling(self, region_ids, type_id, order_type):
+        now = time.time()
+        best = 0.0
+        with self.lock:
+            for region_id in region_ids:
+                entry = self.entries.get(self.key(region_id, type_id, order_type))
+                if entry is None or now - entry[1] > self.ttl:
+                    return None
+                best = max(best, entry[0])
+        return best * (1.0 + self.slack)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.merge(self.read())
+            now = time.time()
+            self.entries = {key: entry for key, entry in self.entries.items() if now - entry[1] <= self.ttl}
+            entries = dict(self.entries)
+            self.dirty = False
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f, separators=(",", ":"))
+                os.replace(temp_path, self.path)
+                self.loaded_mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                pass
+
+
+type_bounds = TypeBounds(TYPE_BOUNDS_PATH, SCAN_PRUNE_TTL, SCAN_PRUNE_SLACK)
+
+
+class ScanState:
+    ORDER_FIELDS = ("order_id", "system_id", "price", "volume_remain", "is_buy_order")
+
+    def __init__(self):
+        self.start_system_id = None
+        self.signature = None
+        self.visited = None
+        self.snapshot = None
+        self.types = {}
+        self.region_versions = {}
+        self.fingerprints = {}
+        self.updated_ts = None
+
+    def prepare(self, start_system_id, signature):
+        if (self.start_system_id, self.signature) != (start_system_id, signature):
+            self.start_system_id = start_system_id
+            self.signature = signature
+            self.visited = None
+            self.snapshot = None
+            self.types = {}
+            self.region_versions = {}
+            self.fingerprints = {}
+
+    def apply_snapshot(self, snapshot, start_region_id):
+        changed = {}
+        for region_id in sorted(snapshot.regions):
+            version = snapshot.region_versions.get(region_id)
+            new_prints = snapshot.fingerprints.get(region_id, {})
+            if region_id not in self.fingerprints:
+                changed[region_id] = None
+            elif version is not None and version == self.region_versions.get(region_id):
                 continue
-            if best_price is None:
-                best_price = price
-                best_order = order
             else:
-                if want_highest and price > best_price:
-                    best_price = price
-                    best_order = order
-                if not want_highest and price < best_price:
-                    best_price = price
-                    best_order = order
-    return best_price, best_order
-
+                old_prints = self.fingerprints[region_id]
+                changed[region_id] = {
+                    type_id
+                    for type_id in set(old_prints) | set(new_prints)
+                    if old_prints.get(type_id) != new_prints.get(type_id)
+                }
+            self.region_versions[region_id] = version
+            self.fingerprints[region_id] = dict(new_prints)
+
+        changed_types = set()
+        for type_id, entry in self.types.items():
+            for region_id, type_ids in changed.items():
+                if type_ids is not None and type_id not in type_ids:
+                    continue
+                stale = False
+                for order_type in ("buy", "sell"):
+                    if entry.get(f"{order_type}_bests", {}).pop(region_id, None) is not None:
+                        stale = True
+                if region_id == start_region_id and "home_sell" in entry:
+                    entry.pop("home_sell", None)
+                    entry.pop("home_sell_vol", None)
+                    stale = True
+                if stale:
+                    changed_types.add(type_id)
+        regions_changed = sorted(region_id for region_id, type_ids in changed.items() if type_ids is None or type_ids)
+        return {
+            "regions_changed": regions_changed,
+            "regions_unchanged": sorted(set(snapshot.regions) - set(regions_changed)),
+            "types_changed": len(changed_types),
+            "types_carried": len(self.types) - len(changed_types),
+        }
 
-def find_best_sell_target(client_ref, region_to_systems, type_id, max_pages=0):
-    best_by_system = {}
-    for region_id, system_ids in region_to_systems.items():
-        for order in iter_region_orders(client_ref, region_id, "sell", type_id, max_pages=max_pages):
-            sys_id = order.get("system_id")
-            if sys_id not in system_ids:
-                continue
-            price = order.get("price")
-            if price is None:
-                continue
-            current = best_by_system.get(sys_id)
-            if current is None or price < current["price"]:
-                best_by_system[sys_id] = {"price": price, "order": order}
+    def to_dict(self):
+        def compact(order):
+            return {field: order.get(field) for field in self.ORDER_FIELDS}
+
+        types = {}
+        for type_id, entry in self.types.items():
+            item = {key: entry[key] for key in ("volume_m3", "home_sell", "home_sell_vol") if key in entry}
+            for order_type in ("buy", "sell"):
+                by_region = entry.get(f"{order_type}_bests")
+                if by_region:
+                    item[f"{order_type}_bests"] = {
+                        str(region_id): {str(sys_id): compact(order) for sys_id, order in bests.items()}
+                        for region_id, bests in by_region.items()
+                    }
+            types[str(type_id)] = item
+        return {
+            "start_system_id": self.start_system_id,
+            "signature": list(self.signature) if self.signature is not None else None,
+            "updated_ts": self.updated_ts,
+            "region_versions": {str(k): v for k, v in self.region_versions.items()},
+            "fingerprints": {
+                str(region_id): {str(type_id): fp for type_id, fp in prints.items()}
+                for region_id, prints in self.fingerprints.items()
+            },
+            "types": types,
+        }
 
-    best_price = None
-    best_order = None
-    for entry in best_by_system.values():
-        if best_price is None or entry["price"] > best_price:
-            best_price = entry["price"]
-            best_order = entry["order"]
-    return best_price, best_order
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.start_system_id = data.get("start_system_id")
+        signature = data.get("signature")
+        state.signature = tuple(signature) if signature is not None else None
+        state.updated_ts = data.get("updated_ts")
+        state.region_versions = {int(k): v for k, v in (data.get("region_versions") or {}).items()}
+        state.fingerprints = {
+            int(region_id): {int(type_id): fp for type_id, fp in prints.items()}
+            for region_id, prints in (data.get("fingerprints") or {}).items()
+        }
+        for type_id, item in (data.get("types") or {}).items():
+            entry = {key: item[key] for key in ("volume_m3", "home_sell", "home_sell_vol") if key in item}
+            for order_type in ("buy", "sell"):
+                by_region = item.get(f"{order_type}_bests")
+                if by_region:
+                    entry[f"{order_type}_bests"] = {
+                        int(region_id): {int(sys_id): order for sys_id, order in bests.items()}
+                        for region_id, bests in by_region.items()
+                    }
+            state.types[int(type_id)] = entry
+        return state
+
+    def save(self, path):
+        self.updated_ts = time.time()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, max_age=None):
+        if not path or not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = cls.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return cls()
+        if max_age is not None and (state.updated_ts is None or time.time() - state.updated_ts > max_age):
+            return cls()
+        return state
 
 
 def calc_profit(buy_price, target_price, tax_pct, broker_pct):
@@ -504,7 +2388,235 @@ def calc_profit(buy_price, target_price, tax_pct, broker_pct):
     return net_sell - buy_price
 
 
-def scan_market(
+def get_type_volume(client_ref, type_id):
+    type_info = client_ref.get_type(type_id) or {}
+    volume_m3 = type_info.get("packaged_volume") or type_info.get("volume")
+    try:
+        return float(volume_m3) if volume_m3 is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def opportunity_row(
+    mode,
+    type_id,
+    start_system_id,
+    start_system_name,
+    home_sell,
+    home_sell_vol,
+    target_price,
+    sys_info,
+    jumps,
+    net_profit,
+    pct,
+    tax_pct,
+    broker_pct,
+    volume_m3,
+    cargo_m3,
+    max_units_budget,
+    max_units_cargo,
+    max_units_trade,
+    profit_total,
+    profit_per_jump,
+):
+    side = "buy" if mode == "instant" else "sell"
+    return {
+        "mode": mode,
+        "type_id": type_id,
+        "origin_system_id": start_system_id,
+        "origin_system_name": start_system_name,
+        "buy_price": round(home_sell, 2),
+        "home_sell": round(home_sell, 2),
+        "home_sell_vol": home_sell_vol,
+        "sell_price": round(target_price, 2),
+        f"best_{side}": round(target_price, 2),
+        f"best_{side}_system": sys_info.get("name"),
+        "jumps": jumps,
+        "security": round(sys_info.get("security", 0.0), 2),
+        "profit_per_unit": round(net_profit, 2),
+        "margin_pct": round(pct, 2),
+        "tax_pct": round(tax_pct, 4),
+        "broker_pct": round(broker_pct, 4),
+        "fee_pct": round(tax_pct + broker_pct, 4),
+        "unit_volume_m3": round(volume_m3, 4),
+        "volume_m3": round(volume_m3, 4),
+        "cargo_m3": cargo_m3,
+        "max_units_budget": max_units_budget,
+        "max_units_cargo": max_units_cargo,
+        "max_units_trade": max_units_trade,
+        "est_profit_budget": round(profit_total, 2),
+        "est_profit_per_jump": round(profit_per_jump, 2),
+        "cargo_m3_used": round(max_units_trade * volume_m3, 2),
+    }
+
+
+def first_rows(group, candidates, *tiebreaks):
+    # Index of the first candidate row per group once rows are ordered by the
+    # tiebreak columns (most significant first), falling back to row order.
+    rows = np.flatnonzero(candidates)
+    if not len(rows):
+        return rows, rows
+    keys = [rows] + [column[rows] for column in reversed(tiebreaks)] + [group[rows]]
+    rows = rows[np.lexsort(keys)]
+    groups, first = np.unique(group[rows], return_index=True)
+    return groups, rows[first]
+
+
+def lookup_positions(values, sorted_keys, key_positions):
+    if not len(sorted_keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    found = np.minimum(np.searchsorted(sorted_keys, values), len(sorted_keys) - 1)
+    return np.where(sorted_keys[found] == values, key_positions[found], -1)
+
+
+def evaluate_snapshot_types(
+    snapshot,
+    type_ids,
+    volumes,
+    start_system_id,
+    start_system_name,
+    systems,
+    region_to_systems,
+    mode,
+    budget,
+    max_price,
+    min_margin_pct,
+    tax_pct,
+    broker_pct,
+    cargo_m3=None,
+    min_profit_per_jump=None,
+):
+    # Column-wise equivalent of scan_market's per-type evaluation: the same best
+    # orders (including tie-breaks) and filters, applied to every type at once.
+    rows_by_type = {}
+    columns = snapshot.column_view()
+    if not type_ids or not len(columns["price"]):
+        return rows_by_type
+    type_ids = np.asarray(type_ids, dtype=np.int64)
+    count = len(type_ids)
+    type_order = np.argsort(type_ids, kind="stable")
+    slot = lookup_positions(columns["type_id"], type_ids[type_order], type_order)
+    price = columns["price"]
+    volume_remain = columns["volume_remain"]
+    system_id = columns["system_id"]
+    is_buy = columns["is_buy"].astype(bool)
+    wanted = slot >= 0
+
+    home_sell = np.full(count, np.nan)
+    home_sell_vol = np.zeros(count, dtype=np.int64)
+    slots, rows = first_rows(slot, wanted & ~is_buy & (system_id == start_system_id), price)
+    home_sell[slots] = price[rows]
+    home_sell_vol[slots] = volume_remain[rows]
+
+    # pick_best_order walks regions, then systems, in sorted order; rank encodes that walk.
+    nearby_ids = np.array(
+        [sys_id for region_id in sorted(region_to_systems) for sys_id in sorted(region_to_systems[region_id])],
+        dtype=np.int64,
+    )
+    nearby_jumps = np.array([systems.get(int(sys_id), {}).get("jumps") or 0 for sys_id in nearby_ids], dtype=np.int64)
+    nearby_order = np.argsort(nearby_ids, kind="stable")
+    rank = lookup_positions(system_id, nearby_ids[nearby_order], nearby_order)
+    in_range = wanted & (rank >= 0)
+
+    volume_m3 = np.array([v if v is not None else np.nan for v in volumes], dtype=np.float64)
+    valid = (volume_m3 > 0) & (home_sell <= max_price)
+
+    def best_orders(candidates, by_system):
+        best_price = np.full(count, np.nan)
+        best_rank = np.full(count, -1, dtype=np.int64)
+        best_volume = np.zeros(count, dtype=np.int64)
+        if by_system is not None:
+            # Cheapest order per (type, system) first, like collect_system_bests.
+            _, candidates = first_rows(slot * len(nearby_ids) + rank, candidates, by_system)
+            mask = np.zeros(len(price), dtype=bool)
+            mask[candidates] = True
+            candidates = mask
+        slots, rows = first_rows(slot, candidates, -price, rank)
+        best_price[slots] = price[rows]
+        best_rank[slots] = rank[rows]
+        best_volume[slots] = volume_remain[rows]
+        return best_price, best_rank, best_volume
+
+    def evaluate(best_price, best_rank, best_volume, fee_pct, pending):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            net_profit = best_price * (1.0 - fee_pct / 100.0) - home_sell
+            pct = np.where(home_sell != 0, (net_profit / home_sell) * 100.0, 0.0)
+            passed = pending & valid & (best_price != 0) & (best_price > home_sell) & (pct >= min_margin_pct)
+            best_system = np.where(best_rank >= 0, nearby_ids[np.maximum(best_rank, 0)], -1)
+            jumps = np.where(best_rank >= 0, nearby_jumps[np.maximum(best_rank, 0)], 0)
+            max_units_budget = np.floor_divide(budget, np.where(passed, home_sell, 1.0)).astype(np.int64)
+            max_units_trade = max_units_budget
+            accepted = passed & (best_system != start_system_id) & (jumps > 0)
+            max_units_cargo = None
+            if cargo_m3:
+                max_units_cargo = np.floor_divide(cargo_m3, np.where(passed, volume_m3, 1.0)).astype(np.int64)
+                accepted &= max_units_cargo > 0
+                max_units_trade = np.minimum(max_units_trade, max_units_cargo)
+            if best_volume is not None:
+                max_units_trade = np.where(best_volume > 0, np.minimum(max_units_trade, best_volume), max_units_trade)
+            accepted &= max_units_trade > 0
+            profit_total = net_profit * max_units_trade
+            profit_per_jump = np.where(jumps > 0, profit_total / np.maximum(jumps, 1), 0.0)
+            if min_profit_per_jump:
+                accepted &= profit_per_jump >= min_profit_per_jump
+        return passed, accepted, {
+            "target_price": best_price,
+            "system_id": best_system,
+            "jumps": jumps,
+            "net_profit": net_profit,
+            "pct": pct,
+            "max_units_budget": max_units_budget,
+            "max_units_cargo": max_units_cargo,
+            "max_units_trade": max_units_trade,
+            "profit_total": profit_total,
+            "profit_per_jump": profit_per_jump,
+        }
+
+    evaluated = []
+    pending = np.ones(count, dtype=bool)
+    if mode in ("instant", "both"):
+        best_price, best_rank, best_volume = best_orders(in_range & is_buy, None)
+        passed, accepted, values = evaluate(best_price, best_rank, best_volume, tax_pct, pending)
+        evaluated.append(("instant", 0.0, accepted, values))
+        # A type that clears the margin but fails a later instant check is not
+        # considered for listing either, matching the per-type loop.
+        pending = ~(passed & ~accepted)
+    if mode in ("list", "both"):
+        best_price, best_rank, _ = best_orders(in_range & ~is_buy, price)
+        _, accepted, values = evaluate(best_price, best_rank, None, tax_pct + broker_pct, pending)
+        evaluated.append(("list", broker_pct, accepted, values))
+
+    for mode_name, row_broker_pct, accepted, values in evaluated:
+        for idx in np.flatnonzero(accepted):
+            sys_info = systems.get(int(values["system_id"][idx]), {})
+            max_units_cargo = values["max_units_cargo"]
+            rows_by_type.setdefault(int(type_ids[idx]), []).append(opportunity_row(
+                mode_name,
+                int(type_ids[idx]),
+                start_system_id,
+                start_system_name,
+                float(home_sell[idx]),
+                int(home_sell_vol[idx]),
+                float(values["target_price"][idx]),
+                sys_info,
+                int(values["jumps"][idx]),
+                float(values["net_profit"][idx]),
+                float(values["pct"][idx]),
+                tax_pct,
+                row_broker_pct,
+                float(volume_m3[idx]),
+                cargo_m3,
+                int(values["max_units_budget"][idx]),
+                int(max_units_cargo[idx]) if max_units_cargo is not None else None,
+                int(values["max_units_trade"][idx]),
+                float(values["profit_total"][idx]),
+                float(values["profit_per_jump"][idx]),
+            ))
+    return rows_by_type
+
+
+def run_market_scan(
+    client,
     start_system,
     budget,
     max_jumps,
@@ -527,12 +2639,25 @@ def scan_market(
     cargo_m3=None,
     min_profit_per_jump=None,
     min_results=None,
+    use_snapshot=None,
+    workers=None,
+    state=None,
+    vectorized=None,
+    on_event=None,
+    cancel=None,
+    prune=None,
 ):
     start_ts = time.monotonic()
+
+    def emit(kind, data):
+        # on_event observes progress ("stage", "progress") and every row as it is
+        # found ("result"); cancel is an Event that stops type evaluation early.
+        if on_event is not None:
+            on_event(kind, data)
+
     deadline = start_ts + max_runtime if max_runtime else None
-    if refresh_cache and os.path.exists(client.cache_path):
-        os.remove(client.cache_path)
-        client.cache = client._load_cache()
+    if refresh_cache:
+        client.clear_cache()
 
     start_system_arg = str(start_system).strip()
     if start_system_arg.isdigit():
@@ -544,15 +2669,28 @@ def scan_market(
     if not start_system_id:
         raise ValueError(f"Unknown start system: {start_system}")
 
-    start_system_data = client.get_system(start_system_id)
-    start_system_name = start_system_data.get("name") or str(start_system_id)
-    const_id = start_system_data.get("constellation_id")
-    if const_id is None:
-        raise ValueError("Could not resolve start system constellation")
-    start_region_id = client.get_constellation(const_id).get("region_id")
+    graph = get_universe_graph()
+    graph_info = graph.system_info(start_system_id) if graph is not None else None
+    if graph_info is not None:
+        start_system_name = graph_info["name"] or str(start_system_id)
+        start_region_id = graph_info["region_id"]
+    else:
+        start_system_data = client.get_system(start_system_id)
+        start_system_name = start_system_data.get("name") or str(start_system_id)
+        const_id = start_system_data.get("constellation_id")
+        if const_id is None:
+            raise ValueError("Could not resolve start system constellation")
+        start_region_id = client.get_constellation(const_id).get("region_id")
     if start_region_id is None:
         raise ValueError("Could not resolve start system region")
 
+    if use_snapshot is None:
+        use_snapshot = SCAN_SNAPSHOT
+    home_pages = home_order_pages if home_order_pages is not None else max(order_pages, 3)
+    if state is not None:
+        state.prepare(start_system_id, (order_pages, home_pages, bool(use_snapshot)))
+
+    emit("stage", {"stage": "nearby", "start_system_id": start_system_id, "start_system_name": start_system_name})
     nearby_cache_path = os.path.join(CACHE_DIR, "nearby_systems.json")
     cached_nearby = None
     if not refresh_nearby:
@@ -566,35 +2704,43 @@ def scan_market(
         systems, region_to_systems = cached_nearby
         nearby_timed_out = False
     else:
+        visited = dict(state.visited) if state is not None and state.visited else None
+        if state is not None and visited is None:
+            visited = {}
         systems, region_to_systems, nearby_timed_out = build_nearby_systems(
             client,
             start_system_id,
             max_jumps,
             min_security,
             deadline=deadline,
+            visited=visited,
         )
-        save_nearby_cache(
-            nearby_cache_path,
-            start_system_id,
-            max_jumps,
-            min_security,
-            systems,
-            region_to_systems,
-        )
+        if state is not None and not nearby_timed_out and visited:
+            state.visited = visited
+        if not nearby_timed_out:
+            save_nearby_cache(
+                nearby_cache_path,
+                start_system_id,
+                max_jumps,
+                min_security,
+                systems,
+                region_to_systems,
+            )
     if not region_to_systems:
         return {
             "generated_at": utc_now(),
             "start_system_id": start_system_id,
             "start_system_name": start_system_name,
+            "esi_memo": client.memo_stats(),
             "results": {"instant": [], "list": []},
         }
 
-    types_cache_path = os.path.join(CACHE_DIR, "types_region.json")
+    emit("stage", {"stage": "types", "systems": len(systems)})
     types = get_region_types(
         client,
         start_region_id,
         max_pages=types_pages,
-        cache_path=types_cache_path,
+        cache_dir=os.path.join(CACHE_DIR, "types"),
         refresh=refresh_types,
     )
     if not types:
@@ -606,13 +2752,29 @@ def scan_market(
         extra_types = []
     else:
         if sample_seed is not None:
-            random.seed(sample_seed)
-            sample_types = random.sample(types, sample_size)
+            sample_types = random.Random(sample_seed).sample(types, sample_size)
         else:
             sample_types = list(types[:sample_size])
         sample_set = set(sample_types)
         extra_types = [type_id for type_id in types if type_id not in sample_set]
 
+    snapshot = None
+    snapshot_timed_out = False
+    delta = None
+    if use_snapshot:
+        emit("stage", {"stage": "snapshot", "regions": len(set(region_to_systems) | {start_region_id})})
+        snapshot, snapshot_complete = build_order_snapshot(
+            client,
+            set(region_to_systems) | {start_region_id},
+            deadline=deadline,
+            snapshot=state.snapshot if state is not None else None,
+        )
+        snapshot_timed_out = not snapshot_complete
+        if state is not None:
+            state.snapshot = snapshot if snapshot_complete else None
+            if snapshot_complete:
+                delta = state.apply_snapshot(snapshot, start_region_id)
+
     budget = float(budget)
     max_price = max_price or budget
     cargo_m3 = float(cargo_m3) if cargo_m3 else None
@@ -620,42 +2782,156 @@ def scan_market(
 
     instant_results = []
     list_results = []
+    results_lock = threading.Lock()
+
+    if prune is None:
+        prune = SCAN_PRUNE
+    bounds = type_bounds if prune else None
+    if bounds is not None:
+        bounds.load()
+    nearby_region_ids = sorted(region_to_systems)
+    min_jumps = min(
+        (
+            info.get("jumps")
+            for sys_id, info in systems.items()
+            if sys_id != start_system_id and (info.get("jumps") or 0) > 0
+        ),
+        default=0,
+    )
+    top_profits = {"instant": [], "list": []}
+    pruned = {"instant": 0, "list": 0}
+
+    timed_out = nearby_timed_out or snapshot_timed_out
+    type_states = state.types if state is not None else {}
+    reused_types = 0
+    types_done = 0
+    types_total = len(sample_types)
+
+    def stopped():
+        if cancel is not None and cancel.is_set():
+            return True
+        return bool(deadline) and time.monotonic() > deadline
+
+    def add_result(rows, row):
+        with results_lock:
+            rows.append(row)
+            if limit > 0:
+                heap = top_profits[row["mode"]]
+                if len(heap) < limit:
+                    heapq.heappush(heap, row["est_profit_budget"])
+                else:
+                    heapq.heappushpop(heap, row["est_profit_budget"])
+            emit("result", row)
+
+    def hopeless(side, type_id, home_sell, volume_m3, fee_pct, margin_only=False):
+        # Upper bound of what this side could still return, from the price
+        # ceiling alone. margin_only keeps the instant side of a "both" scan
+        # to the one test that falls through to the list side as before.
+        if bounds is None or not home_sell:
+            return False
+        ceiling = bounds.ceiling(nearby_region_ids, type_id, "buy" if side == "instant" else "sell")
+        if ceiling is None:
+            return False
+        net_profit = calc_profit(home_sell, ceiling, tax_pct, fee_pct)
+        if ceiling <= home_sell or (net_profit / home_sell) * 100.0 < min_margin_pct:
+            return True
+        if margin_only:
+            return False
+        max_units = int(budget // home_sell)
+        if cargo_m3:
+            max_units = min(max_units, int(cargo_m3 // volume_m3))
+        if max_units <= 0:
+            return True
+        profit_bound = net_profit * max_units
+        if min_profit_per_jump and min_jumps and profit_bound / min_jumps < min_profit_per_jump:
+            return True
+        if limit <= 0 or (min_results and found_count() < min_results):
+            return False
+        with results_lock:
+            heap = top_profits[side]
+            return len(heap) >= limit and round(profit_bound, 2) < heap[0]
+
+    def skip_side(side, *args, **kwargs):
+        if not hopeless(side, *args, **kwargs):
+            return False
+        with results_lock:
+            pruned[side] += 1
+        return True
+
+    def type_done(count=1):
+        nonlocal types_done
+        with results_lock:
+            types_done += count
+            done = types_done
+        emit("progress", {
+            "types_done": done,
+            "types_total": types_total,
+            "found": found_count(),
+            "esi_calls": client.memo_stats()["misses"],
+        })
+
+    def found_count():
+        with results_lock:
+            return len(instant_results) + len(list_results)
 
-    timed_out = nearby_timed_out
     def process_type(type_id):
-        nonlocal timed_out
-        if deadline and time.monotonic() > deadline:
-            timed_out = True
+        if not evaluate_type(type_id):
             return False
+        type_done()
+        return True
 
-        type_info = client.get_type(type_id) or {}
-        volume_m3 = type_info.get("packaged_volume") or type_info.get("volume")
-        try:
-            volume_m3 = float(volume_m3) if volume_m3 is not None else None
-        except (TypeError, ValueError):
-            volume_m3 = None
+    def evaluate_type(type_id):
+        nonlocal timed_out, reused_types
+        if stopped():
+            with results_lock:
+                timed_out = True
+            return False
+
+        entry = type_states.get(type_id)
+        if entry is not None:
+            with results_lock:
+                reused_types += 1
+        else:
+            entry = {}
+            if state is not None:
+                type_states[type_id] = entry
+
+        if "volume_m3" not in entry:
+            entry["volume_m3"] = get_type_volume(client, type_id)
+        volume_m3 = entry["volume_m3"]
 
         if volume_m3 is None or volume_m3 <= 0:
             return True
 
-        home_pages = home_order_pages if home_order_pages is not None else max(order_pages, 3)
-        home_sell, home_sell_vol = find_best_home_sell(
-            client,
-            start_region_id,
-            start_system_id,
-            type_id,
-            max_pages=home_pages,
-        )
+        if "home_sell" not in entry:
+            entry["home_sell"], entry["home_sell_vol"] = find_best_home_sell(
+                client,
+                start_region_id,
+                start_system_id,
+                type_id,
+                max_pages=home_pages,
+                snapshot=snapshot,
+            )
+        home_sell = entry["home_sell"]
+        home_sell_vol = entry["home_sell_vol"]
         if home_sell is None or home_sell > max_price:
             return True
 
-        if mode in ("instant", "both"):
-            best_buy, best_order = find_best_order_in_systems(
-                client,
+        if mode in ("instant", "both") and not skip_side(
+            "instant", type_id, home_sell, volume_m3, 0.0, margin_only=mode == "both"
+        ):
+            best_buy, best_order = pick_best_order(
+                region_order_bests(
+                    client,
+                    entry,
+                    region_to_systems,
+                    "buy",
+                    type_id,
+                    max_pages=order_pages,
+                    snapshot=snapshot,
+                    bounds=bounds,
+                ),
                 region_to_systems,
-                "buy",
-                type_id,
-                max_pages=order_pages,
                 want_highest=True,
             )
             if best_buy and best_buy > home_sell:
@@ -688,41 +2964,43 @@ def scan_market(
                     profit_per_jump = profit_total / jumps if jumps else 0.0
                     if min_profit_per_jump and profit_per_jump < min_profit_per_jump:
                         return True
-                    instant_results.append({
-                        "mode": "instant",
-                        "type_id": type_id,
-                        "origin_system_id": start_system_id,
-                        "origin_system_name": start_system_name,
-                        "buy_price": round(home_sell, 2),
-                        "home_sell": round(home_sell, 2),
-                        "home_sell_vol": home_sell_vol,
-                        "sell_price": round(best_buy, 2),
-                        "best_buy": round(best_buy, 2),
-                        "best_buy_system": sys_info.get("name"),
-                        "jumps": jumps,
-                        "security": round(sys_info.get("security", 0.0), 2),
-                        "profit_per_unit": round(net_profit, 2),
-                        "margin_pct": round(pct, 2),
-                        "tax_pct": round(tax_pct, 4),
-                        "broker_pct": 0.0,
-                        "fee_pct": round(tax_pct, 4),
-                        "unit_volume_m3": round(volume_m3, 4),
-                        "volume_m3": round(volume_m3, 4),
-                        "cargo_m3": cargo_m3,
-                        "max_units_budget": max_units_budget,
-                        "max_units_cargo": max_units_cargo,
-                        "max_units_trade": max_units_trade,
-                        "est_profit_budget": round(profit_total, 2),
-                        "est_profit_per_jump": round(profit_per_jump, 2),
-                        "cargo_m3_used": round(max_units_trade * volume_m3, 2),
-                    })
-
-        if mode in ("list", "both"):
-            best_sell, best_order = find_best_sell_target(
-                client,
+                    add_result(instant_results, opportunity_row(
+                        "instant",
+                        type_id,
+                        start_system_id,
+                        start_system_name,
+                        home_sell,
+                        home_sell_vol,
+                        best_buy,
+                        sys_info,
+                        jumps,
+                        net_profit,
+                        pct,
+                        tax_pct,
+                        0.0,
+                        volume_m3,
+                        cargo_m3,
+                        max_units_budget,
+                        max_units_cargo,
+                        max_units_trade,
+                        profit_total,
+                        profit_per_jump,
+                    ))
+
+        if mode in ("list", "both") and not skip_side("list", type_id, home_sell, volume_m3, broker_pct):
+            best_sell, best_order = pick_best_order(
+                region_order_bests(
+                    client,
+                    entry,
+                    region_to_systems,
+                    "sell",
+                    type_id,
+                    max_pages=order_pages,
+                    snapshot=snapshot,
+                    bounds=bounds,
+                ),
                 region_to_systems,
-                type_id,
-                max_pages=order_pages,
+                want_highest=True,
             )
             if best_sell and best_sell > home_sell:
                 net_profit = calc_profit(home_sell, best_sell, tax_pct, broker_pct)
@@ -751,62 +3029,127 @@ def scan_market(
                     profit_per_jump = profit_total / jumps if jumps else 0.0
                     if min_profit_per_jump and profit_per_jump < min_profit_per_jump:
                         return True
-                    list_results.append({
-                        "mode": "list",
-                        "type_id": type_id,
-                        "origin_system_id": start_system_id,
-                        "origin_system_name": start_system_name,
-                        "buy_price": round(home_sell, 2),
-                        "home_sell": round(home_sell, 2),
-                        "home_sell_vol": home_sell_vol,
-                        "sell_price": round(best_sell, 2),
-                        "best_sell": round(best_sell, 2),
-                        "best_sell_system": sys_info.get("name"),
-                        "jumps": jumps,
-                        "security": round(sys_info.get("security", 0.0), 2),
-                        "profit_per_unit": round(net_profit, 2),
-                        "margin_pct": round(pct, 2),
-                        "tax_pct": round(tax_pct, 4),
-                        "broker_pct": round(broker_pct, 4),
-                        "fee_pct": round(tax_pct + broker_pct, 4),
-                        "unit_volume_m3": round(volume_m3, 4),
-                        "volume_m3": round(volume_m3, 4),
-                        "cargo_m3": cargo_m3,
-                        "max_units_budget": max_units_budget,
-                        "max_units_cargo": max_units_cargo,
-                        "max_units_trade": max_units_trade,
-                        "est_profit_budget": round(profit_total, 2),
-                        "est_profit_per_jump": round(profit_per_jump, 2),
-                        "cargo_m3_used": round(max_units_trade * volume_m3, 2),
-                    })
+                    add_result(list_results, opportunity_row(
+                        "list",
+                        type_id,
+                        start_system_id,
+                        start_system_name,
+                        home_sell,
+                        home_sell_vol,
+                        best_sell,
+                        sys_info,
+                        jumps,
+                        net_profit,
+                        pct,
+                        tax_pct,
+                        broker_pct,
+                        volume_m3,
+                        cargo_m3,
+                        max_units_budget,
+                        max_units_cargo,
+                        max_units_trade,
+                        profit_total,
+                        profit_per_jump,
+                    ))
         return True
 
-    for type_id in sample_types:
-        if not process_type(type_id):
-            break
+    workers = SCAN_WORKERS if workers is None else int(workers)
+    type_rank = {type_id: rank for rank, type_id in enumerate(sample_types + extra_types)}
+    if vectorized is None:
+        vectorized = SCAN_VECTORIZED
+    vectorized = bool(vectorized) and snapshot is not None and np is not None
 
-    total_found = len(instant_results) + len(list_results)
-    if min_results and total_found < min_results and extra_types:
-        for type_id in extra_types:
-            if not process_type(type_id):
+    def evaluate_batch(batch):
+        nonlocal timed_out
+        if stopped():
+            timed_out = True
+            return False
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="scan-type") as executor:
+            volumes = list(executor.map(lambda type_id: get_type_volume(client, type_id), batch))
+        rows_by_type = evaluate_snapshot_types(
+            snapshot,
+            batch,
+            volumes,
+            start_system_id,
+            start_system_name,
+            systems,
+            region_to_systems,
+            mode,
+            budget,
+            max_price,
+            min_margin_pct,
+            tax_pct,
+            broker_pct,
+            cargo_m3=cargo_m3,
+            min_profit_per_jump=min_profit_per_jump,
+        )
+        for type_id in batch:
+            for row in rows_by_type.get(type_id, ()):
+                add_result(instant_results if row["mode"] == "instant" else list_results, row)
+            if min_results and batch is not sample_types and found_count() >= min_results:
                 break
-            total_found = len(instant_results) + len(list_results)
-            if total_found >= min_results:
+        type_done(len(batch))
+        return True
+
+    def include_extra_types():
+        nonlocal types_total
+        types_total += len(extra_types)
+        emit("stage", {"stage": "extra_types", "types_total": types_total})
+
+    emit("stage", {"stage": "evaluate", "types_total": types_total, "vectorized": vectorized})
+
+    if vectorized:
+        if evaluate_batch(sample_types) and min_results and found_count() < min_results:
+            include_extra_types()
+            for start in range(0, len(extra_types), 256):
+                if not evaluate_batch(extra_types[start:start + 256]):
+                    break
+                if found_count() >= min_results:
+                    break
+    elif workers <= 1:
+        for type_id in sample_types:
+            if not process_type(type_id):
                 break
 
+        total_found = found_count()
+        if min_results and total_found < min_results and extra_types:
+            include_extra_types()
+            for type_id in extra_types:
+                if not process_type(type_id):
+                    break
+                total_found = found_count()
+                if total_found >= min_results:
+                    break
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-type")
+        try:
+            completed = all(executor.map(process_type, sample_types))
+            if completed and min_results and found_count() < min_results and extra_types:
+                include_extra_types()
+                for start in range(0, len(extra_types), workers):
+                    batch = extra_types[start:start + workers]
+                    if not all(executor.map(process_type, batch)):
+                        break
+                    if found_count() >= min_results:
+                        break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
     all_type_ids = {row["type_id"] for row in instant_results + list_results}
     name_map = client.resolve_names(sorted(all_type_ids)) if all_type_ids else {}
     for row in instant_results + list_results:
         row["type_name"] = name_map.get(row["type_id"], str(row["type_id"]))
 
-    instant_results.sort(key=lambda r: r["est_profit_budget"], reverse=True)
-    list_results.sort(key=lambda r: r["est_profit_budget"], reverse=True)
+    instant_results.sort(key=lambda r: (-r["est_profit_budget"], type_rank.get(r["type_id"], 0)))
+    list_results.sort(key=lambda r: (-r["est_profit_budget"], type_rank.get(r["type_id"], 0)))
 
     if limit > 0:
         instant_results = instant_results[:limit]
         list_results = list_results[:limit]
 
     client.save_cache()
+    if bounds is not None:
+        bounds.save()
 
     return {
         "generated_at": utc_now(),
@@ -823,6 +3166,13 @@ def scan_market(
         "min_profit_per_jump": min_profit_per_jump,
         "min_results": min_results,
         "partial": timed_out,
+        "cancelled": bool(cancel is not None and cancel.is_set()),
+        "snapshot": snapshot.stats() if snapshot is not None else None,
+        "esi_memo": client.memo_stats(),
+        "reused_types": reused_types,
+        "vectorized": vectorized,
+        "pruned": pruned if bounds is not None else None,
+        "delta": delta,
         "runtime_ms": int((time.monotonic() - start_ts) * 1000),
         "results": {
             "instant": instant_results,
@@ -831,39 +3181,253 @@ def scan_market(
     }
 
 
+def scan_market(*args, **kwargs):
+    # Every scan reads ESI through its own memo: repeated GETs within the scan
+    # are free, but nothing it memoized outlives it or leaks into another scan.
+    return run_market_scan(client.scoped(), *args, **kwargs)
+
+
+class OpportunityStore:
+    # Prewarmed rows for every hub, indexed for the filtered and paginated
+    # /api/scan queries. Each prewarm replaces a hub's rows in one transaction.
+    SORTS = {
+        "profit": ("est_profit_budget", "DESC"),
+        "margin": ("margin_pct", "DESC"),
+        "profit_per_jump": ("est_profit_per_jump", "DESC"),
+        "jumps": ("jumps", "ASC"),
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS opportunities ("
+            "id INTEGER PRIMARY KEY, origin_system_id INTEGER NOT NULL, hub TEXT NOT NULL, "
+            "mode TEXT NOT NULL, type_id INTEGER NOT NULL, margin_pct REAL NOT NULL, "
+            "est_profit_budget REAL NOT NULL, est_profit_per_jump REAL NOT NULL, "
+            "jumps INTEGER NOT NULL, security REAL NOT NULL, expires_ts REAL, row TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS opportunities_origin ON opportunities (origin_system_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS opportunities_security ON opportunities (security)")
+        for column, _ in self.SORTS.values():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS opportunities_{column} ON opportunities ({column}, id)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS opportunities_hub_{column} ON opportunities (hub, {column}, id)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS opportunities_mode_{column} ON opportunities (mode, {column}, id)")
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS opportunities_hub_mode_{column} ON opportunities (hub, mode, {column}, id)"
+            )
+        self.local.conn = conn
+        return conn
+
+    def replace_hub(self, payload):
+        origin_id = payload.get("start_system_id")
+        if origin_id is None:
+            return 0
+        hub = prewarm_key(payload.get("start_system_name") or origin_id)
+        rows = []
+        for mode_key in ("instant", "list"):
+            for row in payload.get("results", {}).get(mode_key, []):
+                row = {
+                    **row,
+                    "origin_system_id": row.get("origin_system_id") or origin_id,
+                    "origin_system_name": row.get("origin_system_name") or payload.get("start_system_name"),
+                    "origin_generated_at": row.get("origin_generated_at") or payload.get("generated_at"),
+                    "origin_cache_expires_at": row.get("origin_cache_expires_at") or payload.get("cache_expires_at"),
+                }
+                rows.append((
+                    origin_id,
+                    hub,
+                    row.get("mode") or mode_key,
+                    row.get("type_id"),
+                    row.get("margin_pct") or 0.0,
+                    row.get("est_profit_budget") or 0.0,
+                    row.get("est_profit_per_jump") or 0.0,
+                    row.get("jumps") or 0,
+                    row.get("security") or 0.0,
+                    payload.get("expires_ts"),
+                    json.dumps(row, separators=(",", ":")),
+                ))
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM opportunities WHERE origin_system_id = ?", (origin_id,))
+            conn.executemany(
+                "INSERT INTO opportunities (origin_system_id, hub, mode, type_id, margin_pct, est_profit_budget, "
+                "est_profit_per_jump, jumps, security, expires_ts, row) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def retain_hubs(self, origin_ids):
+        # Drops hubs that are no longer prewarmed, so "any" queries only see the
+        # hubs the aggregate was built from.
+        origin_ids = sorted({int(origin_id) for origin_id in origin_ids})
+        placeholders = ", ".join("?" for _ in origin_ids)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                f"DELETE FROM opportunities WHERE origin_system_id NOT IN ({placeholders})", origin_ids
+            )
+        return cursor.rowcount
+
+    def resolve_hub(self, start_system):
+        value = str(start_system or "").strip()
+        if value.lower() in ("", "any", "all", "*"):
+            return None
+        if not value.isdigit():
+            return prewarm_key(value)
+        row = self._connect().execute(
+            "SELECT hub FROM opportunities WHERE origin_system_id = ? LIMIT 1", (int(value),)
+        ).fetchone()
+        return row[0] if row else value
+
+    @staticmethod
+    def encode_cursor(value, row_id):
+        raw = json.dumps([value, row_id]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            value, row_id = json.loads(raw)
+            return float(value), int(row_id)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor.")
+
+    def query(
+        self,
+        hub=None,
+        mode=None,
+        min_margin=None,
+        min_profit=None,
+        max_jumps=None,
+        min_security=None,
+        sort="profit",
+        limit=None,
+        cursor=None,
+    ):
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(self.SORTS)}.")
+        column, direction = self.SORTS[sort]
+        limit = max(1, min(int(limit or OPPORTUNITY_PAGE_SIZE), OPPORTUNITY_PAGE_MAX))
+        clauses = []
+        params = []
+        for condition, value in (
+            ("hub = ?", hub),
+            ("mode = ?", mode),
+            ("margin_pct >= ?", min_margin),
+            ("est_profit_budget >= ?", min_profit),
+            ("jumps <= ?", max_jumps),
+            ("security >= ?", min_security),
+        ):
+            if value is not None:
+                clauses.append(condition)
+                params.append(value)
+        if cursor:
+            value, row_id = self.decode_cursor(cursor)
+            op = "<" if direction == "DESC" else ">"
+            clauses.append(f"({column} {op} ? OR ({column} = ? AND id > ?))")
+            params.extend((value, value, row_id))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        found = self._connect().execute(
+            f"SELECT id, {column}, expires_ts, row FROM opportunities {where} "
+            f"ORDER BY {column} {direction}, id ASC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            next_cursor = self.encode_cursor(found[-1][1], found[-1][0])
+        expiries = [expires_ts for _, _, expires_ts, _ in found if expires_ts is not None]
+        return [json.loads(row) for _, _, _, row in found], next_cursor, min(expiries) if expiries else None
+
+
+opportunity_store = OpportunityStore(OPPORTUNITY_DB)
+
+
+def query_opportunities(start_system, sort=None, limit=None, cursor=None, **filters):
+    if filters.get("mode") not in ("instant", "list"):
+        filters["mode"] = None
+    try:
+        hub = opportunity_store.resolve_hub(start_system)
+        rows, next_cursor, expires_ts = opportunity_store.query(
+            hub=hub,
+            sort=sort or "profit",
+            limit=limit,
+            cursor=cursor,
+            **filters,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "generated_at": utc_now(),
+        "start_system_name": rows[0].get("origin_system_name") if hub and rows else PREWARM_AGGREGATE_LABEL,
+        "cached": True,
+        "prewarmed": True,
+        "stale": expires_ts is not None and time.time() > expires_ts,
+        "sort": sort or "profit",
+        "next_cursor": next_cursor,
+        "results": {
+            "instant": [row for row in rows if row.get("mode") == "instant"],
+            "list": [row for row in rows if row.get("mode") == "list"],
+        },
+    }
+
+
 @app.get("/api/scan")
-def scan(start_system: str = Query("Jita")):
+def scan(
+    request: Request,
+    start_system: str = Query("Jita"),
+    mode: str | None = Query(None),
+    min_margin: float | None = Query(None),
+    min_profit: float | None = Query(None),
+    max_jumps: int | None = Query(None),
+    min_security: float | None = Query(None),
+    sort: str | None = Query(None),
+    limit: int | None = Query(None),
+    cursor: str | None = Query(None),
+):
+    filters = {
+        "mode": mode,
+        "min_margin": min_margin,
+        "min_profit": min_profit,
+        "max_jumps": max_jumps,
+        "min_security": min_security,
+    }
+    if sort or limit or cursor or any(value is not None for value in filters.values()):
+        return query_opportunities(start_system, sort=sort, limit=limit, cursor=cursor, **filters)
+
     start_key = (start_system or "").strip().lower()
     if start_key in ("any", "all", "*"):
-        combined = []
-        for system in PREWARM_STATUS_SYSTEMS:
-            payload = load_prewarm_payload(system)
-            if payload is None:
-                continue
-            for mode_key in ("instant", "list"):
-                for row in payload.get("results", {}).get(mode_key, []):
-                    combined.append({
-                        **row,
-                        "origin_system_id": row.get("origin_system_id") or payload.get("start_system_id"),
-                        "origin_system_name": row.get("origin_system_name") or payload.get("start_system_name"),
-                        "origin_generated_at": row.get("origin_generated_at") or payload.get("generated_at"),
-                        "origin_cache_expires_at": row.get("origin_cache_expires_at") or payload.get("cache_expires_at"),
-                    })
-        if not combined:
+        aggregate_file = os.path.exists(PREWARM_AGGREGATE_FILE)
+        if aggregate_file:
+            aggregate = load_cached_file(PREWARM_AGGREGATE_FILE)
+            expires_ts = aggregate.get("expires_ts")
+            aggregate = {**aggregate, "stale": expires_ts is not None and time.time() > expires_ts}
+        else:
+            # Prewarm has not written an aggregate yet; merge the hub files here.
+            payloads = [payload for payload in map(load_prewarm_payload, PREWARM_STATUS_SYSTEMS) if payload]
+            aggregate = build_prewarm_aggregate(payloads)
+        results = aggregate.get("results", {})
+        if not results.get("instant") and not results.get("list"):
             raise HTTPException(
                 status_code=404,
                 detail="No prewarmed data for any hub.",
             )
-        return {
-            "generated_at": utc_now(),
-            "start_system_name": PREWARM_AGGREGATE_LABEL,
-            "cached": True,
-            "prewarmed": True,
-            "results": {
-                "instant": [row for row in combined if row.get("mode") == "instant"],
-                "list": [row for row in combined if row.get("mode") == "list"],
-            },
-        }
+        if aggregate_file:
+            response = compact_payload_response(request, PREWARM_AGGREGATE_FILE, aggregate)
+            if response is not None:
+                return response
+        return aggregate
 
     payload = load_prewarm_payload(start_system)
     if payload is None:
@@ -871,12 +3435,408 @@ def scan(start_system: str = Query("Jita")):
             status_code=404,
             detail=f"No prewarmed data for '{start_system}'.",
         )
+    response = compact_payload_response(request, prewarm_payload_path(start_system), payload)
+    if response is not None:
+        return response
     return payload
 
 
-@app.get("/api/prewarm/status")
-def prewarm_status(systems: str | None = Query(None)):
-    requested = parse_system_list(systems) if systems else PREWARM_STATUS_SYSTEMS
+def live_scan_params(
+    start_system: str = Query(...),
+    budget: float = Query(10000000, gt=0),
+    max_jumps: int = Query(5, ge=0),
+    min_security: float = Query(0.5),
+    min_margin: float = Query(8.0),
+    sample_size: int = Query(40, ge=0),
+    types_pages: int = Query(1, ge=0),
+    order_pages: int = Query(1, ge=0),
+    max_price: float = Query(0, ge=0),
+    mode: str = Query("both"),
+    tax_pct: float = Query(2.0, ge=0),
+    broker_pct: float = Query(3.0, ge=0),
+    limit: int = Query(10, ge=0),
+    max_runtime: int = Query(12, ge=1),
+    sample_seed: int | None = Query(None),
+    home_order_pages: int | None = Query(None, ge=0),
+    cargo_m3: float | None = Query(None, gt=0),
+    min_profit_per_jump: float | None = Query(None, ge=0),
+    min_results: int | None = Query(None, ge=0),
+    tune: bool = Query(True),
+):
+    # Shared query parameters of the live scan endpoints, mapped onto scan_market.
+    start_system = (start_system or "").strip()
+    if not start_system:
+        raise HTTPException(status_code=400, detail="start_system is required.")
+    mode = (mode or "both").strip().lower()
+    if mode not in ("instant", "list", "both"):
+        raise HTTPException(status_code=400, detail="mode must be instant, list or both.")
+    if tune:
+        max_jumps, sample_size, types_pages, order_pages, _ = tune_scan_params(
+            max_jumps, sample_size, types_pages, order_pages
+        )
+    return {
+        "start_system": start_system,
+        "budget": budget,
+        "max_jumps": max_jumps,
+        "min_security": min_security,
+        "min_margin_pct": min_margin,
+        "sample_size": sample_size,
+        "types_pages": types_pages,
+        "order_pages": order_pages,
+        "max_price": max_price,
+        "mode": mode,
+        "tax_pct": tax_pct,
+        "broker_pct": broker_pct,
+        "limit": limit,
+        "max_runtime": max(1, min(max_runtime, SCAN_MAX_RUNTIME)),
+        "sample_seed": sample_seed,
+        "home_order_pages": home_order_pages,
+        "cargo_m3": cargo_m3,
+        "min_profit_per_jump": min_profit_per_jump,
+        "min_results": min_results,
+    }
+
+
+def live_scan_key(params):
+    return make_cache_key(**{**params, "start_system": params["start_system"].lower()})
+
+
+def run_live_scan(params, **extra):
+    return scan_market(refresh_cache=False, refresh_nearby=False, refresh_types=False, **params, **extra)
+
+
+def live_scan_response(payload, cached_ts, cache_status):
+    return {
+        **payload,
+        "cached": cache_status != "miss",
+        "cache_status": cache_status,
+        "prewarmed": False,
+        "cache_expires_at": ts_to_utc(cached_ts + CACHE_TTL),
+    }
+
+
+def trusted_proxy(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def request_owner(request):
+    # X-Forwarded-For is only believed when it was added by a proxy listed in
+    # TRUSTED_PROXIES; the owner is then the nearest hop that is not one of them.
+    host = request.client.host if request.client else "unknown"
+    if not trusted_proxy(host):
+        return host
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for hop in reversed([value.strip() for value in forwarded.split(",") if value.strip()]):
+        if not trusted_proxy(hop):
+            return hop
+        host = hop
+    return host
+
+
+def format_stream_event(kind, data, fmt):
+    if fmt == "sse":
+        return f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+    return json.dumps({"event": kind, "data": data}, separators=(",", ":"), default=str) + "\n"
+
+
+def stream_live_scan(params, fmt):
+    # Runs the scan on its own thread and relays its events as they happen: rows
+    # the moment they are accepted, progress with ESI call counts, then the final
+    # payload. Closing the stream cancels its scan unless other requests are
+    # still waiting on it.
+    events = queue.Queue()
+    cancel = threading.Event()
+    started = time.monotonic()
+
+    def on_event(kind, data):
+        events.put((kind, data))
+
+    def run():
+        try:
+            payload, cached_ts, cache_status = run_cached_scan(
+                live_scan_key(params),
+                lambda shared_cancel: run_live_scan(params, on_event=on_event, cancel=shared_cancel),
+                cancel=cancel,
+            )
+            events.put(("done", live_scan_response(payload, cached_ts, cache_status)))
+        except ValueError as exc:
+            events.put(("error", {"status": 400, "detail": str(exc)}))
+        except Exception as exc:
+            events.put(("error", {"status": 502, "detail": f"Scan failed: {exc}"}))
+
+    threading.Thread(target=run, name="scan-stream", daemon=True).start()
+    streamed = 0
+    names = {}
+    try:
+        while True:
+            try:
+                kind, data = events.get(timeout=SCAN_STREAM_KEEPALIVE)
+            except queue.Empty:
+                yield ": keepalive\n\n" if fmt == "sse" else format_stream_event("ping", {}, fmt)
+                continue
+            if kind == "result":
+                row = dict(data)
+                type_id = row.get("type_id")
+                if type_id not in names:
+                    try:
+                        names.update(client.resolve_names([type_id]))
+                    except Exception:
+                        names[type_id] = str(type_id)
+                row["type_name"] = names.get(type_id, str(type_id))
+                streamed += 1
+                yield format_stream_event("result", row, fmt)
+            elif kind == "progress":
+                yield format_stream_event("progress", {
+                    **data,
+                    "elapsed_ms": int((time.monotonic() - started) * 1000),
+                }, fmt)
+            elif kind == "stage":
+                yield format_stream_event("stage", data, fmt)
+            elif kind == "done":
+                if not streamed:
+                    # Served from cache or joined another scan: no rows were relayed yet.
+                    for mode_key in ("instant", "list"):
+                        for row in data.get("results", {}).get(mode_key, []):
+                            yield format_stream_event("result", row, fmt)
+                yield format_stream_event("done", data, fmt)
+                return
+            else:
+                yield format_stream_event(kind, data, fmt)
+                return
+    finally:
+        cancel.set()
+
+
+class ScanJob:
+    def __init__(self, owner, params):
+        self.id = os.urandom(12).hex()
+        self.owner = owner
+        self.params = params
+        self.key = live_scan_key(params)
+        self.status = "queued"
+        self.created_ts = time.time()
+        self.started_ts = None
+        self.finished_ts = None
+        self.stage = None
+        self.progress = {}
+        self.rows = {"instant": [], "list": []}
+        self.result = None
+        self.error = None
+        self.cancel = threading.Event()
+        self.lock = threading.Lock()
+
+    def on_event(self, kind, data):
+        with self.lock:
+            if kind == "stage":
+                self.stage = data.get("stage")
+            elif kind == "progress":
+                self.progress = data
+            elif kind == "result":
+                self.rows.setdefault(data.get("mode") or "instant", []).append(data)
+
+    def finish(self, status, result=None, error=None):
+        with self.lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_ts = time.time()
+
+    def to_dict(self, limit=None):
+        with self.lock:
+            data = {
+                "job_id": self.id,
+                "status": self.status,
+                "start_system": self.params.get("start_system"),
+                "created_at": ts_to_utc(self.created_ts),
+                "started_at": ts_to_utc(self.started_ts) if self.started_ts else None,
+                "finished_at": ts_to_utc(self.finished_ts) if self.finished_ts else None,
+                "stage": self.stage,
+                "progress": self.progress,
+                "error": self.error,
+                "result": self.result,
+            }
+            if self.result is None:
+                data["partial_results"] = {
+                    mode_key: sorted(rows, key=lambda row: -(row.get("est_profit_budget") or 0))[:limit or None]
+                    for mode_key, rows in self.rows.items()
+                }
+            return data
+
+
+class ScanJobQueue:
+    # Jobs wait in one queue per owner and the workers take owners in turn, so a
+    # single client submitting many scans cannot starve everyone else.
+    def __init__(self, workers, max_queued, max_per_owner, retention):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_per_owner = max_per_owner
+        self.retention = retention
+        self.jobs = {}
+        self.pending = {}
+        self.owners = deque()
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def prune(self, now):
+        with self.lock:
+            expired = [
+                job_id
+                for job_id, job in self.jobs.items()
+                if job.finished_ts is not None and now - job.finished_ts > self.retention
+            ]
+            for job_id in expired:
+                self.jobs.pop(job_id, None)
+
+    def submit(self, owner, params):
+        now = time.time()
+        self.prune(now)
+        job = ScanJob(owner, params)
+        cached = peek_cached_scan(job.key)
+        with self.lock:
+            if cached is not None:
+                job.finish("done", result=live_scan_response(cached[0], cached[1], "hit"))
+                self.jobs[job.id] = job
+                return job
+            active = [item for item in self.jobs.values() if item.status in ("queued", "running")]
+            for item in active:
+                if item.owner == owner and item.key == job.key:
+                    return item
+            if sum(1 for item in active if item.owner == owner) >= self.max_per_owner:
+                raise HTTPException(status_code=429, detail="Too many scans in progress for this client.")
+            if sum(1 for item in active if item.status == "queued") >= self.max_queued:
+                raise HTTPException(status_code=503, detail="Scan queue is full, try again shortly.")
+            self.jobs[job.id] = job
+            if owner not in self.pending:
+                self.pending[owner] = deque()
+                self.owners.append(owner)
+            self.pending[owner].append(job)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan-job")
+            executor = self.executor
+        executor.submit(self.run_next)
+        return job
+
+    def cancel(self, job):
+        job.cancel.set()
+        with job.lock:
+            queued = job.status == "queued"
+        if queued:
+            job.finish("cancelled")
+
+    def next_job(self):
+        with self.lock:
+            while self.owners:
+                owner = self.owners.popleft()
+                pending = self.pending[owner]
+                job = pending.popleft()
+                if pending:
+                    self.owners.append(owner)
+                else:
+                    del self.pending[owner]
+                with job.lock:
+                    if job.status != "queued":
+                        continue
+                    job.status = "running"
+                    job.started_ts = time.time()
+                return job
+        return None
+
+    def run_next(self):
+        job = self.next_job()
+        if job is None:
+            return
+        try:
+            payload, cached_ts, cache_status = run_cached_scan(
+                job.key,
+                lambda shared_cancel: run_live_scan(job.params, on_event=job.on_event, cancel=shared_cancel),
+                cancel=job.cancel,
+            )
+        except Exception as exc:
+            job.finish("failed", error=str(exc))
+            return
+        status = "cancelled" if job.cancel.is_set() else "done"
+        job.finish(status, result=live_scan_response(payload, cached_ts, cache_status))
+
+
+scan_jobs = ScanJobQueue(SCAN_JOB_WORKERS, SCAN_JOB_QUEUE_MAX, SCAN_JOB_USER_MAX, SCAN_JOB_RETENTION)
+
+
+@app.on_event("startup")
+def warn_untrusted_proxies():
+    if SCAN_JOB_USER_MAX > 0 and not TRUSTED_PROXIES:
+        print(
+            "TRUSTED_PROXIES is empty: scan jobs are owned by the peer address, so behind a "
+            "reverse proxy every client shares one owner and one SCAN_JOB_USER_MAX quota",
+            flush=True,
+        )
+
+
+@app.get("/api/scan/live")
+def scan_live(params: dict = Depends(live_scan_params)):
+    try:
+        payload, cached_ts, cache_status = run_cached_scan(
+            live_scan_key(params),
+            lambda shared_cancel: run_live_scan(params, cancel=shared_cancel),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except (HTTPError, URLError, OSError) as exc:
+        raise HTTPException(status_code=502, detail=f"ESI request failed: {exc}")
+    return live_scan_response(payload, cached_ts, cache_status)
+
+
+@app.get("/api/scan/stream")
+def scan_stream(
+    request: Request,
+    params: dict = Depends(live_scan_params),
+    format: str | None = Query(None),
+):
+    fmt = (format or "").strip().lower()
+    if not fmt:
+        fmt = "sse" if "text/event-stream" in (request.headers.get("accept") or "") else "ndjson"
+    if fmt not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be sse or ndjson.")
+    return StreamingResponse(
+        stream_live_scan(params, fmt),
+        media_type="text/event-stream" if fmt == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/scan/jobs", status_code=202)
+def submit_scan_job(request: Request, params: dict = Depends(live_scan_params)):
+    job = scan_jobs.submit(request_owner(request), params)
+    return job.to_dict(limit=params["limit"])
+
+
+@app.get("/api/scan/jobs/{job_id}")
+def get_scan_job(job_id: str, limit: int | None = Query(None, ge=0)):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown scan job.")
+    return job.to_dict(limit=limit if limit is not None else job.params["limit"])
+
+
+@app.delete("/api/scan/jobs/{job_id}")
+def cancel_scan_job(request: Request, job_id: str):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown scan job.")
+    if job.owner != request_owner(request):
+        raise HTTPException(status_code=403, detail="Scan job belongs to another client.")
+    scan_jobs.cancel(job)
+    return job.to_dict(limit=job.params["limit"])
+
+
+def build_prewarm_status(requested):
     now = time.time()
     items = []
     counts = {"fresh": 0, "stale": 0, "missing": 0, "error": 0}
@@ -897,8 +3857,7 @@ def prewarm_status(systems: str | None = Query(None)):
             continue
 
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
+            payload = load_cached_file(path)
         except Exception as exc:
             generated_at = ts_to_utc(os.path.getmtime(path))
             items.append(
@@ -974,11 +3933,13 @@ def prewarm_status(systems: str | None = Query(None)):
     last_run = None
     if os.path.exists(status_path):
         try:
-            with open(status_path, "r", encoding="utf-8") as f:
-                last_run = json.load(f)
+            last_run = load_cached_file(status_path)
         except Exception:
             last_run = None
-    history = load_history(history_path, limit=10)
+    try:
+        history = load_cached_file(history_path, load_history)
+    except OSError:
+        history = []
 
     summary = {
         **counts,
@@ -995,3 +3956,48 @@ def prewarm_status(systems: str | None = Query(None)):
         "history": history,
         "systems": items,
     }
+
+
+@app.get("/api/prewarm/status")
+def prewarm_status(request: Request, systems: str | None = Query(None)):
+    requested = parse_system_list(systems) if systems else PREWARM_STATUS_SYSTEMS
+    return json_payload_response(request, build_prewarm_status(requested))
+
+
+async def prewarm_status_events(request, requested):
+    # One status event per change of PREWARM_OUTPUT_DIR (or when the earliest hub
+    # expires); otherwise just an idle check of the watcher's version each second.
+    sent_tag = request.headers.get("last-event-id")
+    version = None
+    next_check = 0.0
+    last_write = time.monotonic()
+    while True:
+        if await request.is_disconnected():
+            return
+        current = prewarm_watcher.current()
+        now = time.time()
+        if current != version or now >= next_check:
+            version = current
+            status = await run_in_threadpool(build_prewarm_status, requested)
+            next_expiry = parse_iso_ts((status.get("summary") or {}).get("next_expiry_at"))
+            next_check = next_expiry + 1 if next_expiry is not None and next_expiry > now else now + 3600
+            tag = payload_tag(status)
+            if tag != sent_tag:
+                sent_tag = tag
+                last_write = time.monotonic()
+                yield f"id: {tag}\nevent: status\ndata: {json.dumps(status, separators=(',', ':'), default=str)}\n\n"
+                continue
+        if time.monotonic() - last_write >= PREWARM_EVENTS_KEEPALIVE:
+            last_write = time.monotonic()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(1)
+
+
+@app.get("/api/prewarm/events")
+def prewarm_events(request: Request, systems: str | None = Query(None)):
+    requested = parse_system_list(systems) if systems else PREWARM_STATUS_SYSTEMS
+    return StreamingResponse(
+        prewarm_status_events(request, requested),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
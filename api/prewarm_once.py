@@ -1,11 +1,23 @@
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import fcntl
 
-from main import CACHE_TTL, scan_market, tune_scan_params
+from main import (
+    CACHE_DIR,
+    CACHE_TTL,
+    ScanState,
+    build_prewarm_aggregate,
+    client,
+    opportunity_store,
+    scan_market,
+    tune_scan_params,
+    write_payload_variants,
+)
 
 
 def ts_to_utc(ts):
@@ -33,7 +45,9 @@ def is_fresh(path, now, ttl):
 
 def write_payload(path, payload):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    temp_path = f"{path}.tmp"
+    # Variants first: the API keys their ETag on the main file's generated_at.
+    write_payload_variants(path, {**payload, "stale": False})
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     with open(temp_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, indent=2, sort_keys=True)
     os.replace(temp_path, path)
@@ -54,16 +68,51 @@ def acquire_lock(path):
 
 
 def write_status(path, payload):
-    temp_path = f"{path}.tmp"
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     with open(temp_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, indent=2, sort_keys=True)
     os.replace(temp_path, path)
 
 
+def write_aggregate(path, output_dir, systems):
+    payloads = []
+    for system in systems:
+        key = str(system)
+        if not key.isdigit():
+            key = prewarm_key(key)
+        hub_path = prewarm_path(output_dir, key)
+        if not os.path.exists(hub_path):
+            continue
+        try:
+            with open(hub_path, "r", encoding="utf-8") as f:
+                payloads.append(json.load(f))
+        except (OSError, ValueError) as exc:
+            print(f"Skipping {hub_path} in aggregate: {exc}", flush=True)
+    if payloads:
+        write_payload(path, build_prewarm_aggregate(payloads))
+        origin_ids = [payload["start_system_id"] for payload in payloads if payload.get("start_system_id")]
+        if origin_ids:
+            opportunity_store.retain_hubs(origin_ids)
+    return len(payloads)
+
+
+def http_cache_token():
+    if client.http_cache is None:
+        return None
+    return client.http_cache.snapshot_counters()
+
+
+def http_cache_stats(token):
+    if client.http_cache is None or token is None:
+        return None
+    return client.http_cache.stats_since(token)
+
+
 def run():
     output_dir = os.getenv("PREWARM_OUTPUT_DIR", "/data/prewarm")
     status_path = os.getenv("PREWARM_STATUS_FILE", os.path.join(output_dir, "last_run.json"))
     lock_path = os.getenv("PREWARM_LOCK_FILE", os.path.join(output_dir, "prewarm.lock"))
+    aggregate_path = os.getenv("PREWARM_AGGREGATE_FILE", os.path.join(output_dir, "aggregate.json"))
     os.makedirs(output_dir, exist_ok=True)
 
     start_systems = parse_start_systems(
@@ -96,6 +145,7 @@ def run():
         write_status(status_path, status_payload)
         return
 
+    cache_token = http_cache_token()
     try:
         max_jumps_default = int(os.getenv("PREWARM_MAX_JUMPS", "5"))
         sample_size_default = int(os.getenv("PREWARM_SAMPLE_SIZE", "40"))
@@ -125,6 +175,14 @@ def run():
         retry_empty = os.getenv("PREWARM_RETRY_EMPTY", "0").lower() in ("1", "true", "yes")
 
         tune_enabled = os.getenv("PREWARM_TUNE", "1").lower() in ("1", "true", "yes")
+        snapshot_enabled = os.getenv("PREWARM_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+        delta_enabled = os.getenv("PREWARM_DELTA", "0").lower() in ("1", "true", "yes")
+        delta_max_age = int(os.getenv("PREWARM_DELTA_MAX_AGE", "21600"))
+        state_dir = os.getenv("PREWARM_STATE_DIR", os.path.join(CACHE_DIR, "prewarm_state"))
+        if delta_enabled:
+            snapshot_enabled = True
+
+        workers = max(1, int(os.getenv("PREWARM_WORKERS", "1")))
 
         failures = 0
         successes = 0
@@ -133,7 +191,7 @@ def run():
         errors = {}
         now = time.time()
 
-        for system in start_systems:
+        def prewarm_system(system):
             name_key = prewarm_key(system)
             name_path = prewarm_path(output_dir, name_key)
             if is_fresh(name_path, now, CACHE_TTL) and not force:
@@ -146,13 +204,11 @@ def run():
                             existing_results.get("list", [])
                         )
                         if existing_count > 0:
-                            skipped += 1
-                            continue
+                            return "skipped", 0, None
                     except Exception:
                         pass
                 else:
-                    skipped += 1
-                    continue
+                    return "skipped", 0, None
 
             try:
                 if tune_enabled:
@@ -168,6 +224,11 @@ def run():
                     types_pages = types_pages_default
                     order_pages = order_pages_default
                     tuned = False
+                state_path = os.path.join(state_dir, f"{name_key}.json")
+                if delta_enabled:
+                    state = ScanState.load(state_path, max_age=delta_max_age)
+                else:
+                    state = ScanState()
                 data = scan_market(
                     system,
                     budget,
@@ -191,6 +252,8 @@ def run():
                     cargo_m3,
                     min_profit_per_jump,
                     min_results,
+                    use_snapshot=snapshot_enabled,
+                    state=state,
                 )
                 results = data.get("results", {})
                 opportunity_count = len(results.get("instant", [])) + len(results.get("list", []))
@@ -221,6 +284,8 @@ def run():
                         cargo_m3,
                         min_profit_per_jump,
                         min_results,
+                        use_snapshot=snapshot_enabled,
+                        state=state,
                     )
                     results = data.get("results", {})
                     opportunity_count = len(results.get("instant", [])) + len(results.get("list", []))
@@ -228,21 +293,40 @@ def run():
                 data["tuned"] = tuned
                 data["max_jumps_requested"] = fallback_max_jumps if fallback_used else max_jumps
                 data["fallback_used"] = fallback_used
+                if delta_enabled and not data.get("partial"):
+                    state.save(state_path)
                 stamp = time.time()
                 data["cached"] = True
                 data["prewarmed"] = True
                 data["cache_expires_at"] = ts_to_utc(stamp + CACHE_TTL)
                 data["expires_ts"] = stamp + CACHE_TTL
-                total_opportunities += opportunity_count
                 write_payload(name_path, data)
                 if data.get("start_system_id"):
                     id_path = prewarm_path(output_dir, data["start_system_id"])
                     write_payload(id_path, data)
-                successes += 1
+                opportunity_store.replace_hub(data)
+                return "ok", opportunity_count, None
             except Exception as exc:
-                failures += 1
-                errors[system] = str(exc)
                 print(f"Prewarm failed for {system}: {exc}", flush=True)
+                return "failed", 0, str(exc)
+
+        if workers > 1 and len(start_systems) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm") as executor:
+                outcomes = list(executor.map(prewarm_system, start_systems))
+        else:
+            outcomes = [prewarm_system(system) for system in start_systems]
+
+        for system, (outcome, opportunity_count, error) in zip(start_systems, outcomes):
+            if outcome == "skipped":
+                skipped += 1
+            elif outcome == "ok":
+                successes += 1
+                total_opportunities += opportunity_count
+            else:
+                failures += 1
+                errors[system] = error
+
+        aggregate_hubs = write_aggregate(aggregate_path, output_dir, start_systems)
 
         finished_at = time.time()
         if failures and successes:
@@ -266,6 +350,9 @@ def run():
             "cache_ttl_sec": CACHE_TTL,
             "total_opportunities": total_opportunities,
             "tuned": tune_enabled,
+            "workers": workers,
+            "aggregate_hubs": aggregate_hubs,
+            "http_cache": http_cache_stats(cache_token),
             "errors": errors,
         }
         write_status(status_path, status_payload)
@@ -293,6 +380,7 @@ def run():
             "cache_ttl_sec": CACHE_TTL,
             "total_opportunities": total_opportunities,
             "tuned": tuned_value,
+            "http_cache": http_cache_stats(cache_token),
             "errors": {"__run__": str(exc)},
         }
         write_status(status_path, status_payload)
@@ -304,6 +392,8 @@ def run():
             f.write("\n")
         raise
     finally:
+        if client.http_cache is not None:
+            client.http_cache.prune()
         fcntl.flock(lock_fd, fcntl.LOCK_UN)
         os.close(lock_fd)
 
@@ -438,6 +438,7 @@ let activeLocale = "en";
 let activeRoutes = [];
 let activeSource = "idle";
 let isLoading = false;
+let renderPending = false;
 
 const formatters = {
   number: (locale) => new Intl.NumberFormat(locale),
@@ -757,6 +758,9 @@ const fetchLiveRoutes = async () => {
   });
   window.clearTimeout(timeoutId);
 
+  if (response.status === 404) {
+    return null;
+  }
   if (!response.ok) {
     throw new Error("Scan failed");
   }
@@ -764,10 +768,84 @@ const fetchLiveRoutes = async () => {
   return response.json();
 };
 
+const scheduleRender = () => {
+  if (renderPending) {
+    return;
+  }
+  renderPending = true;
+  window.requestAnimationFrame(() => {
+    renderPending = false;
+    filterRoutes();
+  });
+};
+
+const streamLiveRoutes = async (onRows) => {
+  const params = new URLSearchParams({
+    start_system: getStartSystem(),
+    max_runtime: String(LIVE_DEFAULTS.maxRuntime)
+  });
+
+  const controller = new AbortController();
+  const timeoutId = window.setTimeout(() => controller.abort(), (LIVE_DEFAULTS.maxRuntime + 6) * 1000);
+  try {
+    const response = await fetch(`/api/scan/stream?${params.toString()}`, {
+      headers: {
+        Accept: "application/x-ndjson"
+      },
+      signal: controller.signal
+    });
+    if (!response.ok || !response.body) {
+      throw new Error("Scan failed");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const rows = [];
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      let newline = buffer.indexOf("\n");
+      while (newline >= 0) {
+        const line = buffer.slice(0, newline).trim();
+        buffer = buffer.slice(newline + 1);
+        newline = buffer.indexOf("\n");
+        if (!line) {
+          continue;
+        }
+        const message = JSON.parse(line);
+        if (message.event === "result") {
+          rows.push(message.data);
+          onRows(rows);
+        } else if (message.event === "done") {
+          return message.data;
+        } else if (message.event === "error") {
+          throw new Error((message.data && message.data.detail) || "Scan failed");
+        }
+      }
+    }
+    throw new Error("Scan stream ended early");
+  } finally {
+    window.clearTimeout(timeoutId);
+  }
+};
+
 const runLiveScan = async () => {
   setLoadingState(true);
   try {
-    const payload = await fetchLiveRoutes();
+    let payload = await fetchLiveRoutes();
+    if (!payload) {
+      // No prewarmed data for this system: scan it live and show rows as they arrive.
+      activeSource = "live";
+      updateResultsSource();
+      payload = await streamLiveRoutes((rows) => {
+        activeRoutes = mapLiveResults({ results: { instant: rows } });
+        scheduleRender();
+      });
+    }
     const mapped = mapLiveResults(payload);
     activeRoutes = mapped;
     activeSource = payload.cached ? "cached" : "live";
@@ -150,6 +150,7 @@ const AUTO_REFRESH_MS = 60000;
 let activeLocale = localStorage.getItem("locale") || "en";
 let autoRefresh = true;
 let autoTimer = null;
+let statusSource = null;
 
 const getTranslation = (key) => {
   const segments = key.split(".");
@@ -464,6 +465,10 @@ const refresh = async () => {
   updateSummary(null);
 
   const status = await fetchStatus(systemsParam);
+  renderStatus(status);
+};
+
+const renderStatus = (status) => {
   if (!status.summary && (!status.systems || status.systems.length === 0)) {
     elements.monitorGrid.innerHTML = "";
     elements.monitorEmpty.textContent =
@@ -496,7 +501,24 @@ const setAutoRefresh = (enabled) => {
     clearInterval(autoTimer);
     autoTimer = null;
   }
-  if (autoRefresh) {
+  if (statusSource) {
+    statusSource.close();
+    statusSource = null;
+  }
+  if (!autoRefresh) {
+    return;
+  }
+  if (window.EventSource) {
+    // The server pushes a status event only when prewarm writes new files.
+    const systemsParam = getSystemsParam();
+    const url = systemsParam
+      ? `/api/prewarm/events?systems=${encodeURIComponent(systemsParam)}`
+      : "/api/prewarm/events";
+    statusSource = new EventSource(url);
+    statusSource.addEventListener("status", (event) => {
+      renderStatus(JSON.parse(event.data));
+    });
+  } else {
     autoTimer = setInterval(refresh, AUTO_REFRESH_MS);
   }
 };